@@ -17,6 +17,18 @@ from utils.message_formatter import escape_html_chars, escape_markdown_chars, sp
 
 logger = logging.getLogger(__name__)
 
+# Telegram 无法通过 URL 获取媒体时返回的错误信息（小写）
+URL_FETCH_ERRORS = (
+    "wrong file identifier/http url specified",
+    "failed to get http url content",
+    "wrong type of the web page content",
+)
+
+def is_url_fetch_error(error: Exception) -> bool:
+    """判断是否为 Telegram 通过 URL 获取媒体失败的错误"""
+    error_msg = str(error).lower()
+    return any(pattern in error_msg for pattern in URL_FETCH_ERRORS)
+
 class TelegramSender:
     """
     基于线程本地存储的 Telegram 消息发送器
@@ -51,7 +63,7 @@ class TelegramSender:
         self.connection_pool_size = connection_pool_size
         self._local = threading.local()
         
-        logger.info(f"TelegramSender 初始化完成，线程本地存储模式")
+        logger.info("TelegramSender 初始化完成，线程本地存储模式")
 
     @property
     def bot(self) -> Bot:
@@ -67,7 +79,7 @@ class TelegramSender:
                 self._local.bot is not None):
                 return self._local.bot
         except Exception as e:
-            logger.warning(f"访问现有 Bot 实例时出错: {e}")
+            logger.warning("访问现有 Bot 实例时出错: %s", e)
             # 清理可能损坏的实例
             self._local.bot = None
         
@@ -84,10 +96,10 @@ class TelegramSender:
             
             self._local.bot = Bot(token=self.bot_token, request=request)
             thread_name = threading.current_thread().name
-            logger.debug(f"为线程 {thread_name} 创建新的 Bot 实例，连接池大小: 30")
+            logger.debug("为线程 %s 创建新的 Bot 实例，连接池大小: 30", thread_name)
             return self._local.bot
         except Exception as e:
-            logger.error(f"创建 Bot 实例失败: {e}")
+            logger.error("创建 Bot 实例失败: %s", e)
             raise
 
     def cleanup_current_bot(self):
@@ -95,7 +107,7 @@ class TelegramSender:
         if hasattr(self._local, 'bot'):
             self._local.bot = None
             thread_name = threading.current_thread().name
-            logger.debug(f"清理线程 {thread_name} 的 Bot 实例")
+            logger.debug("清理线程 %s 的 Bot 实例", thread_name)
 
     async def cleanup_current_bot_async(self):
         """异步清理当前线程的 Bot 实例"""
@@ -103,9 +115,9 @@ class TelegramSender:
             try:
                 await self._local.bot.shutdown()
                 thread_name = threading.current_thread().name
-                logger.debug(f"异步清理线程 {thread_name} 的 Bot 实例")
+                logger.debug("异步清理线程 %s 的 Bot 实例", thread_name)
             except Exception as e:
-                logger.warning(f"清理 Bot 实例时出错: {e}")
+                logger.warning("清理 Bot 实例时出错: %s", e)
             finally:
                 self._local.bot = None
 
@@ -131,6 +143,7 @@ class TelegramSender:
                 # 检查是否为参数错误（不应该重试的错误）
                 non_retryable_errors = [
                     "invalid file http url specified",
+                    *URL_FETCH_ERRORS,
                     "unsupported url protocol",
                     "invalid url",
                     "bad request",
@@ -141,7 +154,7 @@ class TelegramSender:
 
                 # 如果是参数错误，直接抛出不重试
                 if any(error_pattern in error_msg for error_pattern in non_retryable_errors):
-                    logger.error(f"❌ 参数错误，不进行重试: {e}")
+                    logger.error("❌ 参数错误，不进行重试: %s", e)
                     raise
 
                 last_exception = e
@@ -149,10 +162,10 @@ class TelegramSender:
                     # 针对连接池超时使用更长的等待时间
                     if "Pool timeout" in str(e) or "connection pool" in str(e).lower():
                         wait_time = self.retry_delay * (3 ** attempt)  # 更激进的退避策略
-                        logger.warning(f"⚠️ 连接池超时，{wait_time}秒后重试 (尝试 {attempt + 1}/{self.max_retries}): {e}")
+                        logger.warning("⚠️ 连接池超时，%s秒后重试 (尝试 %s/%s): %s", wait_time, attempt + 1, self.max_retries, e)
                     else:
                         wait_time = self.retry_delay * (2 ** attempt)  # 普通网络错误
-                        logger.warning(f"⚠️ 网络错误，{wait_time}秒后重试 (尝试 {attempt + 1}/{self.max_retries}): {e}")
+                        logger.warning("⚠️ 网络错误，%s秒后重试 (尝试 %s/%s): %s", wait_time, attempt + 1, self.max_retries, e)
                     
                     await asyncio.sleep(wait_time)
                     
@@ -163,7 +176,7 @@ class TelegramSender:
                     else:
                         self.cleanup_current_bot()
                 else:
-                    logger.error(f"操作最终失败，已重试 {self.max_retries} 次: {e}")
+                    logger.error("操作最终失败，已重试 %s 次: %s", self.max_retries, e)
                     break
             except TelegramError as e:
                 # 🆕 新增：对特定 Telegram 错误的处理
@@ -171,15 +184,15 @@ class TelegramSender:
                 if "flood control" in error_msg or "too many requests" in error_msg:
                     # 触发限流，等待更长时间
                     wait_time = 60  # 等待1分钟
-                    logger.warning(f"触发 Telegram 限流，等待 {wait_time} 秒后重试")
+                    logger.warning("触发 Telegram 限流，等待 %s 秒后重试", wait_time)
                     await asyncio.sleep(wait_time)
                     if attempt < self.max_retries:
                         continue
                 
-                logger.error(f"Telegram API 错误: {e}")
+                logger.error("Telegram API 错误: %s", e)
                 raise
             except Exception as e:
-                logger.error(f"未知错误: {e}")
+                logger.error("未知错误: %s", e)
                 raise
         
         # 所有重试都失败了
@@ -254,7 +267,7 @@ class TelegramSender:
             if i < len(segments) - 1:
                 await asyncio.sleep(0.5)
         
-        logger.info(f"长文本已分 {len(segments)} 段发送完成")
+        logger.info("长文本已分 %s 段发送完成", len(segments))
         return messages[0]
 
     async def send_photo(self, chat_id: Optional[int] = None, photo: Union[str, Path, BytesIO, bytes] = None, caption: str = "", 
@@ -1233,7 +1246,7 @@ class TelegramSender:
                     await asyncio.sleep(0.5)
             except Exception as e:
                 # 删除失败不影响设置新头像的操作
-                logger.warning(f"删除旧头像时出错（将继续设置新头像）: {e}")
+                logger.warning("删除旧头像时出错（将继续设置新头像）: %s", e)
         
         # 处理不同类型的头像输入
         if isinstance(photo, str):
@@ -1339,7 +1352,7 @@ class TelegramSender:
         if max_length > 0 and text_length > max_length:
             original_text = text
             text = text[:max_length-3] + "..."
-            logger.warning(f"内容过长已截断! 原文：{original_text}")
+            logger.warning("内容过长已截断! 原文：%s", original_text)
         
         # 格式化文本
         if parse_mode == ParseMode.HTML:
@@ -3,6 +3,7 @@ import logging
 from typing import Any, Dict, Optional, Union
 
 import aiohttp
+import orjson
 import requests
 
 import config
@@ -83,6 +84,12 @@ class WeChatAPIPaths:
         return {attr.lower(): getattr(cls, attr) 
                 for attr in cls.list_paths()}
 
+def _build_request_body(body: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """构造请求体参数，使用 orjson 直接序列化为 bytes"""
+    if body is None:
+        return {}
+    return {"data": orjson.dumps(body), "headers": {"Content-Type": "application/json"}}
+
 def _resolve_api_path(api_path: str) -> Optional[str]:
   """解析API路径"""
   if api_path.startswith('/'):
@@ -128,11 +135,11 @@ async def wechat_api(
         async with aiohttp.ClientSession(timeout=client_timeout) as session:
             async with session.post(
                 url=api_url,
-                json=body,
-                params=query_params
+                params=query_params,
+                **_build_request_body(body)
             ) as response:
                 if response.status == 200:
-                    return await response.json()
+                    return await response.json(loads=orjson.loads)
                 else:
                     response_text = await response.text()
                     logger.error(f"API调用失败 [{api_path}]，状态码: {response.status}, 响应: {response_text}")
@@ -176,13 +183,13 @@ def wechat_api_sync(
     try:
         response = requests.post(
             url=api_url,
-            json=body,
             params=query_params,
-            timeout=timeout
+            timeout=timeout,
+            **_build_request_body(body)
         )
         
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         else:
             logger.error(f"API调用失败 [{api_path}]，状态码: {response.status_code}, 响应: {response.text}")
             return False
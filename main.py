@@ -22,6 +22,7 @@ from typing import List
 import config
 from utils.contact_manager import initialize_contact_manager
 from utils.group_manager import initialize_group_manager
+from utils.message_mapper import initialize_message_mapper, shutdown_message_mapper
 
 class DailyRotatingHandler(RotatingFileHandler):
     """按天切换的日志处理器，自动清理旧日志文件"""
@@ -268,6 +269,7 @@ class ServiceManager:
         modules_to_init = [
             ("联系人管理器", initialize_contact_manager),
             ("群组管理器", initialize_group_manager),
+            ("消息映射管理器", initialize_message_mapper),
         ]
         
         success_count = 0
@@ -389,7 +391,13 @@ class ServiceManager:
         for service_name, thread in self.service_threads.items():
             self.logger.info(f"⚠️ 等待服务 {service_name} 结束...")
             thread.join(timeout=5)
-        
+
+        # 关闭消息映射数据库连接
+        try:
+            await shutdown_message_mapper()
+        except Exception as e:
+            self.logger.error(f"❌ 关闭消息映射管理器时出错: {e}")
+
         self.logger.info("🔴 服务管理器已停止")
     
     async def wait_for_services_startup(self, timeout=15):
@@ -22,7 +22,7 @@ async def main():
     async def get_news():
         """获取60s新闻"""
         try:
-            news = get_60s("both")
+            news = await get_60s("both")
 
             # 检查新闻日期是否为今天
             today = datetime.now().strftime('%Y-%m-%d')
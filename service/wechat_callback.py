@@ -39,7 +39,7 @@ async def get_or_create_processor(contact_id: str) -> ContactMessageProcessor:
             processor = ContactMessageProcessor(contact_id)
             await processor.start()
             contact_processors[contact_id] = processor
-            logger.debug(f"📝 为联系人 {contact_id} 创建新的处理器")
+            logger.debug("📝 为联系人 %s 创建新的处理器", contact_id)
         return contact_processors[contact_id]
 
 async def cleanup_idle_processors():
@@ -62,7 +62,7 @@ async def cleanup_idle_processors():
                 for contact_id in idle_contacts[:10]:  # 限制每次最多清理10个
                     processor = contact_processors.pop(contact_id)
                     await processor.stop()
-                    logger.debug(f"🧹 清理空闲处理器: {contact_id}")
+                    logger.debug("🧹 清理空闲处理器: %s", contact_id)
                     
         except Exception as e:
             logger.error(f"❌ 清理处理器时出错: {e}")
@@ -160,7 +160,7 @@ async def process_callback_data(callback_data: Dict[str, Any]) -> Dict[str, Any]
         if duplicate_count > 0:
             logger.info(f"📊 消息处理完成 - 处理: {processed_count}, 失败: {failed_count}, 重复: {duplicate_count}")
         elif processed_count > 0 or failed_count > 0:
-            logger.debug(f"📊 消息处理完成 - 处理: {processed_count}, 失败: {failed_count}")
+            logger.debug("📊 消息处理完成 - 处理: %s, 失败: %s", processed_count, failed_count)
         
         return {
             "success": True,
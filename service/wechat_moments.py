@@ -3,7 +3,6 @@ import logging
 import os
 import signal
 import sys
-from datetime import datetime
 from typing import Optional, Callable, Any
 
 import config
@@ -106,9 +105,10 @@ class WeChatMomentsMonitorService:
         if not new_data:
             return
         
-        # 这里处理增量数据
+        # 这里处理增量数据，同一批次内共享联系人缓存
+        contact_cache = {}
         for item in new_data:
-            await process_moment_data(item)
+            await process_moment_data(item, contact_cache)
             logger.debug(
                 f"新朋友圈 - ID: {item['Id']}, "
                 f"用户: {item['Username']}, "
@@ -119,11 +119,6 @@ class WeChatMomentsMonitorService:
     async def _check_updates(self):
         """单次检查更新"""
         try:
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # 显示当前状态
-            last_time = self.extractor.get_last_create_time_formatted()
-            
             # 获取朋友圈数据
             moment_list = await self._fetch_moments_data()
             if moment_list is None:
@@ -141,7 +136,6 @@ class WeChatMomentsMonitorService:
             
             if new_data:
                 await self._process_new_data(new_data)
-                updated_time = self.extractor.get_last_create_time_formatted()
                 
         except Exception as e:
             logger.error(f"检查更新时发生错误: {e}")
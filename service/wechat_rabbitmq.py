@@ -40,7 +40,7 @@ class ContactMessageProcessor:
         if not self.is_running:
             self.is_running = True
             self.processing_task = asyncio.create_task(self._process_messages())
-            logger.debug(f"🚀 启动联系人 {self.contact_id} 的消息处理器")
+            logger.debug("🚀 启动联系人 %s 的消息处理器", self.contact_id)
     
     async def stop(self):
         """停止消息处理器"""
@@ -61,7 +61,7 @@ class ContactMessageProcessor:
             except asyncio.QueueEmpty:
                 break
         
-        logger.debug(f"🔴 停止联系人 {self.contact_id} 的消息处理器")
+        logger.debug("🔴 停止联系人 %s 的消息处理器", self.contact_id)
     
     async def _process_messages(self):
         """处理消息的主循环"""
@@ -79,7 +79,7 @@ class ContactMessageProcessor:
                 # 处理消息
                 try:
                     await process_rabbitmq_message(message_data)
-                    logger.debug(f"✅ 成功处理联系人 {self.contact_id} 的消息")
+                    logger.debug("✅ 成功处理联系人 %s 的消息", self.contact_id)
                 except Exception as e:
                     logger.error(f"❌ 处理联系人 {self.contact_id} 消息失败: {e}")
                 
@@ -213,7 +213,7 @@ class WeChatRabbitMQConsumer:
                 processor = ContactMessageProcessor(contact_id)
                 await processor.start()
                 self.contact_processors[contact_id] = processor
-                logger.debug(f"📝 为联系人 {contact_id} 创建新的处理器")
+                logger.debug("📝 为联系人 %s 创建新的处理器", contact_id)
             return self.contact_processors[contact_id]
     
     async def cleanup_idle_processors(self):
@@ -236,7 +236,7 @@ class WeChatRabbitMQConsumer:
                     for contact_id in idle_contacts[:10]:  # 限制每次最多清理10个
                         processor = self.contact_processors.pop(contact_id)
                         await processor.stop()
-                        logger.debug(f"🧹 清理空闲处理器: {contact_id}")
+                        logger.debug("🧹 清理空闲处理器: %s", contact_id)
                         
             except Exception as e:
                 logger.error(f"❌ 清理处理器时出错: {e}")
@@ -793,7 +793,7 @@ async def handle_wechat_message(message: str, msg_obj: AbstractIncomingMessage)
         if duplicate_count > 0:
             logger.info(f"📊 消息处理完成 - 处理: {processed_count}, 失败: {failed_count}, 重复: {duplicate_count}")
         elif processed_count > 0 or failed_count > 0:
-            logger.debug(f"📊 消息处理完成 - 处理: {processed_count}, 失败: {failed_count}")
+            logger.debug("📊 消息处理完成 - 处理: %s, 失败: %s", processed_count, failed_count)
         
         # 只要有消息被处理就算成功
         return processed_count > 0 or failed_count == 0
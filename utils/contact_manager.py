@@ -92,6 +92,9 @@ class ContactManager:
         
         self._initialized = False
         
+        # chatId -> wxId 查询缓存，联系人表有写入时清空
+        self._wxid_by_chatid: Dict[int, str] = {}
+        
         # 确保数据库目录存在
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
     
@@ -181,13 +184,22 @@ class ContactManager:
             await self.initialize()
         
         try:
+            chat_id = int(chat_id)
+            wxid = self._wxid_by_chatid.get(chat_id)
+            if wxid is not None:
+                return wxid
+            
             async with aiosqlite.connect(self.db_path) as db:
                 db.row_factory = aiosqlite.Row
                 cursor = await db.execute(
-                    "SELECT wxid FROM contacts WHERE chat_id = ?", (int(chat_id),)
+                    "SELECT wxid FROM contacts WHERE chat_id = ?", (chat_id,)
                 )
                 row = await cursor.fetchone()
-                return row['wxid'] if row else None
+                if not row:
+                    return None
+                
+                self._wxid_by_chatid[chat_id] = row['wxid']
+                return row['wxid']
                 
         except Exception as e:
             logger.error(f"❌ 通过ChatID获取wxId失败 {chat_id}: {e}")
@@ -280,6 +292,7 @@ class ContactManager:
                     contact.wx_name
                 ))
                 await db.commit()
+                self._wxid_by_chatid.clear()
             
             return True
             
@@ -296,6 +309,7 @@ class ContactManager:
             async with aiosqlite.connect(self.db_path) as db:
                 cursor = await db.execute("DELETE FROM contacts WHERE wxid = ?", (wxid,))
                 await db.commit()
+                self._wxid_by_chatid.clear()
                 
                 # 删除wx好友
                 payload = {
@@ -324,6 +338,7 @@ class ContactManager:
             async with aiosqlite.connect(self.db_path) as db:
                 cursor = await db.execute("DELETE FROM contacts WHERE chat_id = ?", (int(chat_id),))
                 await db.commit()
+                self._wxid_by_chatid.clear()
                 
                 if cursor.rowcount > 0:
                     logger.info(f"🗑️ 成功通过ChatID删除联系人: {chat_id}")
@@ -384,6 +399,7 @@ class ContactManager:
             async with aiosqlite.connect(self.db_path) as db:
                 cursor = await db.execute(sql, update_values)
                 await db.commit()
+                self._wxid_by_chatid.clear()
                 
                 if cursor.rowcount > 0:
                     logger.info(f"✅ 成功更新联系人: {wxid}, 更新字段: {list(updates.keys())}")
@@ -444,6 +460,7 @@ class ContactManager:
             async with aiosqlite.connect(self.db_path) as db:
                 cursor = await db.execute(sql, update_values)
                 await db.commit()
+                self._wxid_by_chatid.clear()
                 
                 return cursor.rowcount > 0
                 
@@ -546,6 +563,7 @@ class ContactManager:
                     ))
                     saved_count += 1
                 await db.commit()
+                self._wxid_by_chatid.clear()
             
             logger.info(f"✅ 批量保存联系人完成: {saved_count} 个")
             return saved_count
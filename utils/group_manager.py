@@ -163,7 +163,7 @@ class GroupMemberManager:
             logger.error(f"❌ 查询显示名称失败: {e}")
         
         # 3. 缓存未命中，立即更新群组信息
-        logger.debug(f"缓存未命中，立即更新群组: {chatroom_id}")
+        logger.debug("缓存未命中，立即更新群组: %s", chatroom_id)
         update_success = await self.update_group_members(chatroom_id, force=True)
         
         if update_success:
@@ -198,7 +198,7 @@ class GroupMemberManager:
         try:
             # 检查是否需要更新
             if not force and not await self._should_update_group(chatroom_id):
-                logger.debug(f"群组 {chatroom_id} 缓存仍有效，跳过更新")
+                logger.debug("群组 %s 缓存仍有效，跳过更新", chatroom_id)
                 return True
             
             # 构建payload - 使用您原文件的方式
@@ -208,7 +208,7 @@ class GroupMemberManager:
             }
             
             # 获取群成员信息 - 使用您原文件的API调用方式
-            logger.debug(f"开始更新群组成员信息: {chatroom_id}")
+            logger.debug("开始更新群组成员信息: %s", chatroom_id)
             group_member_response = await wechat_api("GROUP_MEMBER", payload)
             
             if not group_member_response or "Data" not in group_member_response:
@@ -3,53 +3,88 @@ import logging
 import re
 import xml.etree.ElementTree as ET
 from html import unescape
+from xml.sax.saxutils import escape as saxutils_escape
 from typing import Any, Dict, List, Optional, Union, Tuple
 from types import SimpleNamespace
 
+from lxml import etree as lxml_etree
+
 logger = logging.getLogger(__name__)
 
+# 微信消息XML来自任意联系人，不可信：不展开实体、不访问网络
+SAFE_XML_PARSER = lxml_etree.XMLParser(resolve_entities=False, no_network=True)
+
+# 发送到微信的回复消息（type=57）appmsg模板，参数需先经过xml_escape
+REPLY_APPMSG_XML = (
+    '<appmsg appid="" sdkver="0"><title>{title}</title><des /><action /><type>57</type><showtype>0</showtype>'
+    '<soundtype>0</soundtype><mediatagname /><messageext /><messageaction /><content /><contentattr>0</contentattr>'
+    '<url /><lowurl /><dataurl /><lowdataurl /><songalbumurl /><songlyric /><appattach><totallen>0</totallen>'
+    '<attachid /><emoticonmd5 /><fileext /><aeskey /></appattach><extinfo /><sourceusername /><sourcedisplayname />'
+    '<thumburl /><md5 /><statextstr /><refermsg><content>{content}</content><type>1</type><svrid>{svrid}</svrid>'
+    '<chatusr>{chatusr}</chatusr><fromusr>{fromusr}</fromusr></refermsg></appmsg>'
+)
+
+# 发送到微信的链接消息（type=5）appmsg模板，参数需先经过xml_escape
+LINK_APPMSG_XML = '<appmsg><title>{title}</title><des>{des}</des><type>5</type><url>{url}</url><thumburl></thumburl></appmsg>'
+
+def xml_escape(text: str) -> str:
+    """转义 &、<、> 后用于填充appmsg模板"""
+    return saxutils_escape(text)
+
+def normalize_link_url(url: str) -> str:
+    """为缺少协议头的链接补全 http://，微信链接卡片需要完整URL"""
+    if url.startswith(('http://', 'https://')):
+        return url
+    return f"http://{url}"
+
+def parse_xml_root(xml_string):
+    """使用 lxml 解析 XML 字符串并返回根元素"""
+    # 处理XML声明
+    if xml_string.startswith('<?xml'):
+        xml_string = xml_string.split('?>', 1)[1]
+    
+    return lxml_etree.fromstring(xml_string.encode('utf-8'), SAFE_XML_PARSER)
+
+def element_to_dict(element):
+    """递归将 XML 元素转换为字典"""
+    result = {}
+    
+    # 添加属性
+    if element.attrib:
+        result.update(element.attrib)
+    
+    # 处理子元素
+    for child in element:
+        child_name = child.tag
+        # lxml 会把注释和处理指令也作为子节点返回，跳过
+        if not isinstance(child_name, str):
+            continue
+        child_dict = element_to_dict(child)
+        
+        # 如果同名子元素已存在，则转为列表
+        if child_name not in result:
+            result[child_name] = child_dict
+        elif isinstance(result[child_name], list):
+            result[child_name].append(child_dict)
+        else:
+            result[child_name] = [result[child_name], child_dict]
+    
+    # 添加文本内容（如果有且没有其他属性或子元素）
+    text = element.text
+    if text:
+        text = text.strip()
+        if text:
+            if not result:  # 如果没有其他属性或子元素
+                return text
+            result["_text"] = text
+        
+    return result
+
 # 解析XML内容
 def xml_to_json(xml_string, as_string=False):
     try:
-        # 处理XML声明
-        if xml_string.startswith('<?xml'):
-            xml_string = xml_string.split('?>', 1)[1]
-            
         # 解析 XML 字符串
-        root = ET.fromstring(xml_string)
-        
-        # 递归函数，将 XML 元素转换为字典
-        def element_to_dict(element):
-            result = {}
-            
-            # 添加属性
-            if element.attrib:
-                for key, value in element.attrib.items():
-                    result[key] = value
-            
-            # 处理子元素
-            children = list(element)
-            if children:
-                for child in children:
-                    child_name = child.tag
-                    child_dict = element_to_dict(child)
-                    
-                    # 如果同名子元素已存在，则转为列表
-                    if child_name in result:
-                        if not isinstance(result[child_name], list):
-                            result[child_name] = [result[child_name]]
-                        result[child_name].append(child_dict)
-                    else:
-                        result[child_name] = child_dict
-            
-            # 添加文本内容（如果有且没有其他属性或子元素）
-            text = element.text
-            if text and text.strip():
-                if not result:  # 如果没有其他属性或子元素
-                    return text.strip()
-                result["_text"] = text.strip()
-                
-            return result
+        root = parse_xml_root(xml_string)
         
         # 转换为字典
         json_data = {root.tag: element_to_dict(root)}
@@ -1,17 +1,76 @@
 import asyncio
+import itertools
 import logging
 import os
 import sqlite3
 import threading
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict, Set
 
 import aiosqlite
 
 logger = logging.getLogger(__name__)
 
+# 数据库结构版本，修改表结构或索引时递增
+SCHEMA_VERSION = 2
+
+# 预先构建的SQL语句，保持文本一致以命中连接的预编译语句缓存
+SQL_CACHED_STATEMENTS = 256
+
+SQL_UPSERT = '''
+    INSERT INTO message_mappings 
+    (tgmsgid, fromwxid, towxid, msgid, clientmsgid, createtime, content, telethonmsgid)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(tgmsgid) DO UPDATE SET
+        fromwxid = excluded.fromwxid,
+        towxid = excluded.towxid,
+        msgid = excluded.msgid,
+        clientmsgid = excluded.clientmsgid,
+        createtime = excluded.createtime,
+        content = excluded.content,
+        telethonmsgid = excluded.telethonmsgid
+'''
+
+SQL_SELECT_SINCE = 'SELECT * FROM message_mappings WHERE createtime >= ? ORDER BY tgmsgid'
+
+SQL_SEARCH_BY_FIELD = {
+    field: f'''
+        SELECT * FROM message_mappings 
+        WHERE {field} = ? AND createtime >= ?
+        ORDER BY tgmsgid DESC
+        LIMIT 1
+    '''
+    for field in ('tgmsgid', 'msgid', 'telethonmsgid')
+}
+
+SQL_SELECT_TGMSGID_BY_FROM = 'SELECT tgmsgid FROM message_mappings WHERE fromwxid = ? AND createtime >= ?'
+
+SQL_COUNT_ALL = 'SELECT COUNT(*) FROM message_mappings'
+
+# 统计已存在的tgmsgid数量，用于区分UPSERT中的插入和更新
+SQL_COUNT_EXISTING = 'SELECT COUNT(*) FROM message_mappings WHERE tgmsgid IN ({placeholders})'
+SQL_MAX_VARIABLES = 500
+
+SQL_DELETE_BEFORE_LIMIT = '''
+    DELETE FROM message_mappings WHERE tgmsgid IN (
+        SELECT tgmsgid FROM message_mappings WHERE createtime < ? LIMIT ?
+    )
+'''
+
+def _safe_int(value: Any) -> int:
+    """转换为整数，无法转换时返回0"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
 class MappingResult:
     """映射结果对象，支持obj.attr访问方式"""
+    __slots__ = ('tgmsgid', 'fromwxid', 'towxid', 'msgid', 'clientmsgid',
+                 'createtime', 'content', 'telethonmsgid')
+    
     def __init__(self, data: dict):
         self.tgmsgid = data.get('tgmsgid', 0)
         self.fromwxid = data.get('fromwxid', '')
@@ -22,6 +81,14 @@ class MappingResult:
         self.content = data.get('content', '')
         self.telethonmsgid = data.get('telethonmsgid', 0)
     
+    @classmethod
+    def from_row(cls, row: tuple) -> 'MappingResult':
+        """从数据库行直接创建，列顺序与表结构一致"""
+        result = cls.__new__(cls)
+        (result.tgmsgid, result.fromwxid, result.towxid, result.msgid,
+         result.clientmsgid, result.createtime, result.content, result.telethonmsgid) = row
+        return result
+    
     def to_dict(self) -> dict:
         """转换为字典格式"""
         return {
@@ -52,33 +119,162 @@ class MappingManager:
         )
         self.database_dir = os.path.dirname(self.db_path)
         
-        # 内存缓存，用于快速查询今日数据
-        self.memory_cache = []
-        self.cache_lock = threading.RLock()
+        # 内存缓存，用于快速查询今日数据（按三个查询键分别建立索引）
+        self._by_tg: Dict[int, MappingResult] = {}
+        self._by_msgid: Dict[int, MappingResult] = {}
+        self._by_telethon: Dict[int, MappingResult] = {}
+        self._by_from: Dict[str, Set[int]] = defaultdict(set)
+        # 缓存条数上限，超出后按写入顺序淘汰最早的条目（dict保持插入顺序）
+        self.cache_max_size = 50000
+        
+        # 按天缓存的零点时间戳，跨过午夜后失效
+        self._day_start_cache: Dict[int, int] = {}
+        self._day_expires = 0
+        
+        # 数据库总行数，启动时统计一次，之后随写入和清理增量维护
+        self._row_count = 0
         
         # 定期清理配置
         self.cleanup_enabled = True
         self.cleanup_days_to_keep = 7  # 默认保留7天
         self.cleanup_hour = 2  # 凌晨2点执行清理
         self.cleanup_task = None
+        self.cleanup_batch_size = 5000  # 每个事务删除的最大行数
+        
+        # 读写分离的长连接：单个写连接 + 多个只读连接
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_cycle = None
+        self._reader_count = min(4, os.cpu_count() or 1)
+        self._db_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        
+        # 同步只读连接（每个线程一个），供其他线程的事件循环做点查，不阻塞所属事件循环
+        self._sync_local = threading.local()
+        self._sync_readers: List[sqlite3.Connection] = []
+        
+        # 批量写入配置：积攒待写入映射，按数量或时间合并提交
+        self.flush_batch_size = 200
+        self.flush_interval = 0.05  # 秒
+        self._pending_writes: List[MappingResult] = []
+        # 其他线程会直接追加待写入队列并在其中查找，增删需持有该锁
+        self._pending_lock = threading.Lock()
+        # 写入完成后才移出队列，同一时间只允许一个写入过程处理队列
+        self._flush_lock = asyncio.Lock()
+        self._flush_event = asyncio.Event()
+        self._flush_closing = False
+        self._flush_task = None
+        
+        # 所属事件循环，在start()中确定
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started = False
         
         # 确保数据库目录存在
         if not os.path.exists(self.database_dir):
             os.makedirs(self.database_dir)
+
+    async def start(self):
+        """按顺序初始化数据库、加载今日缓存并启动后台任务"""
+        if self._started:
+            return
+        
+        self._loop = asyncio.get_running_loop()
         
         # 初始化数据库
-        asyncio.create_task(self._init_database())
+        await self._init_database()
         
         # 加载今日数据到缓存
-        asyncio.create_task(self._load_today_to_cache())
+        await self._load_today_to_cache()
+        
+        # 统计数据库总行数
+        await self._refresh_row_count()
+        
+        # 启动批量写入任务，启动前已排队的映射一并写入
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        self._flush_task.add_done_callback(self._on_flush_task_done)
+        if self._pending_writes:
+            self._flush_event.set()
         
         # 启动定期清理任务
-        asyncio.create_task(self._start_cleanup_scheduler())
+        await self._start_cleanup_scheduler()
+        
+        self._started = True
+
+    async def _get_writer(self) -> aiosqlite.Connection:
+        """获取写连接，首次调用时建立并开启WAL"""
+        if self._writer is None:
+            async with self._db_lock:
+                if self._writer is None:
+                    writer = await aiosqlite.connect(self.db_path, cached_statements=SQL_CACHED_STATEMENTS)
+                    await writer.execute('PRAGMA journal_mode=WAL')
+                    # WAL模式下NORMAL同步级别仍能保证一致性，且提交时不必每次fsync
+                    await writer.execute('PRAGMA synchronous=NORMAL')
+                    self._writer = writer
+        return self._writer
+
+    async def _get_reader(self) -> aiosqlite.Connection:
+        """轮询获取一个只读连接"""
+        if self._reader_cycle is None:
+            # 只读连接要求数据库文件已存在，先确保写连接建立
+            await self._get_writer()
+            async with self._db_lock:
+                if self._reader_cycle is None:
+                    self._readers = [
+                        await aiosqlite.connect(
+                            f"file:{self.db_path}?mode=ro", uri=True, cached_statements=SQL_CACHED_STATEMENTS
+                        )
+                        for _ in range(self._reader_count)
+                    ]
+                    self._reader_cycle = itertools.cycle(self._readers)
+        return next(self._reader_cycle)
+
+    def _get_sync_reader(self) -> sqlite3.Connection:
+        """获取当前线程的同步只读连接"""
+        conn = getattr(self._sync_local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"file:{self.db_path}?mode=ro", uri=True,
+                check_same_thread=False, cached_statements=SQL_CACHED_STATEMENTS
+            )
+            self._sync_local.conn = conn
+            self._sync_readers.append(conn)
+        return conn
+
+    async def _rollback_writer(self):
+        """写入失败时回滚未完成的事务"""
+        if self._writer is not None and self._writer.in_transaction:
+            try:
+                await self._writer.rollback()
+            except Exception as e:
+                logger.error(f"❌ 回滚事务失败: {e}")
+
+    def _day_start_timestamp(self, days_ago: int = 0) -> int:
+        """获取指定天数前当天零点的时间戳，结果缓存到当天结束"""
+        if time.time() >= self._day_expires:
+            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            self._day_start_cache = {0: int(today_start.timestamp())}
+            self._day_expires = int((today_start + timedelta(days=1)).timestamp())
+        
+        timestamp = self._day_start_cache.get(days_ago)
+        if timestamp is None:
+            today_start = datetime.fromtimestamp(self._day_start_cache[0])
+            timestamp = int((today_start - timedelta(days=days_ago)).timestamp())
+            self._day_start_cache[days_ago] = timestamp
+        return timestamp
 
     async def _init_database(self):
-        """初始化数据库表结构"""
+        """初始化数据库表结构，仅在结构版本升级时执行建表和建索引"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            db = await self._get_writer()
+            async with self._write_lock:
+                async with db.execute('PRAGMA user_version') as cursor:
+                    row = await cursor.fetchone()
+                version = row[0] if row else 0
+                
+                if version >= SCHEMA_VERSION:
+                    logger.info("✅ 消息映射数据库已是最新结构")
+                    return
+                
                 await db.execute('''
                     CREATE TABLE IF NOT EXISTS message_mappings (
                         tgmsgid INTEGER PRIMARY KEY,
@@ -88,124 +284,315 @@ class MappingManager:
                         clientmsgid INTEGER DEFAULT 0,
                         createtime INTEGER DEFAULT 0,
                         content TEXT DEFAULT '',
-                        telethonmsgid INTEGER DEFAULT 0,
-                        date TEXT NOT NULL
+                        telethonmsgid INTEGER DEFAULT 0
                     )
                 ''')
                 
-                # 创建索引
-                await db.execute('CREATE INDEX IF NOT EXISTS idx_date ON message_mappings(date)')
-                await db.execute('CREATE INDEX IF NOT EXISTS idx_msgid ON message_mappings(msgid)')
-                await db.execute('CREATE INDEX IF NOT EXISTS idx_telethonmsgid ON message_mappings(telethonmsgid)')
-                await db.execute('CREATE INDEX IF NOT EXISTS idx_fromwxid ON message_mappings(fromwxid)')
-                await db.execute('CREATE INDEX IF NOT EXISTS idx_date_tgmsgid ON message_mappings(date, tgmsgid)')
+                # 移除旧版本的索引
+                for index_name in ('idx_date', 'idx_msgid', 'idx_telethonmsgid', 'idx_fromwxid',
+                                   'idx_date_tgmsgid', 'idx_date_msgid', 'idx_date_telethon', 'idx_date_from'):
+                    await db.execute(f'DROP INDEX IF EXISTS {index_name}')
                 
+                # 旧版本表中的date列与createtime重复，补齐缺失的createtime后删除
+                async with db.execute('PRAGMA table_info(message_mappings)') as cursor:
+                    columns = [column[1] for column in await cursor.fetchall()]
+                if 'date' in columns:
+                    await db.execute(
+                        "UPDATE message_mappings SET createtime = CAST(strftime('%s', date, 'utc') AS INTEGER) "
+                        "WHERE createtime = 0"
+                    )
+                    await db.execute('ALTER TABLE message_mappings DROP COLUMN date')
+                
+                # 创建与查询条件匹配的复合索引（等值列在前，时间范围列在后）
+                await db.execute('CREATE INDEX IF NOT EXISTS idx_createtime ON message_mappings(createtime)')
+                await db.execute('CREATE INDEX IF NOT EXISTS idx_msgid_createtime ON message_mappings(msgid, createtime)')
+                await db.execute('CREATE INDEX IF NOT EXISTS idx_telethon_createtime ON message_mappings(telethonmsgid, createtime)')
+                await db.execute('CREATE INDEX IF NOT EXISTS idx_from_createtime ON message_mappings(fromwxid, createtime)')
+                
+                await db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
                 await db.commit()
-                logger.info("✅ 消息映射数据库初始化完成")
+                logger.info(f"✅ 消息映射数据库初始化完成 (结构版本 {SCHEMA_VERSION})")
         except Exception as e:
             logger.error(f"❌ 数据库初始化失败: {e}")
 
     async def _load_today_to_cache(self):
         """将今日数据加载到内存缓存"""
-        today = datetime.now().strftime("%Y-%m-%d")
+        today_start = self._day_start_timestamp()
         
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute(
-                    'SELECT * FROM message_mappings WHERE date = ? ORDER BY tgmsgid DESC',
-                    (today,)
-                ) as cursor:
-                    rows = await cursor.fetchall()
+            # 先写入待保存的映射，避免重新加载时丢失
+            await self._flush_pending()
+            
+            db = await self._get_reader()
+            async with db.execute(SQL_SELECT_SINCE, (today_start,)) as cursor:
+                rows = await cursor.fetchall()
                     
-                with self.cache_lock:
-                    self.memory_cache = []
-                    for row in rows:
-                        self.memory_cache.append(MappingResult({
-                            'tgmsgid': row[0],
-                            'fromwxid': row[1],
-                            'towxid': row[2],
-                            'msgid': row[3],
-                            'clientmsgid': row[4],
-                            'createtime': row[5],
-                            'content': row[6],
-                            'telethonmsgid': row[7]
-                        }))
+            self._cache_clear()
+            for row in rows:
+                self._cache_put(MappingResult.from_row(row))
                     
-                logger.info(f"📅 加载了 {len(self.memory_cache)} 条今日映射到内存缓存")
+            logger.info(f"📅 加载了 {len(self._by_tg)} 条今日映射到内存缓存")
         except Exception as e:
             logger.error(f"❌ 加载今日数据到缓存失败: {e}")
-            with self.cache_lock:
-                self.memory_cache = []
+            self._cache_clear()
+
+    def _cache_put(self, mapping: MappingResult):
+        """写入内存缓存并更新索引，需在所属事件循环中调用"""
+        old = self._by_tg.get(mapping.tgmsgid)
+        if old is not None:
+            self._cache_discard(old)
+        
+        self._by_tg[mapping.tgmsgid] = mapping
+        
+        # 同一个键对应多条映射时保留tgmsgid最大的一条
+        current = self._by_msgid.get(mapping.msgid)
+        if current is None or current.tgmsgid <= mapping.tgmsgid:
+            self._by_msgid[mapping.msgid] = mapping
+        
+        if mapping.telethonmsgid:
+            current = self._by_telethon.get(mapping.telethonmsgid)
+            if current is None or current.tgmsgid <= mapping.tgmsgid:
+                self._by_telethon[mapping.telethonmsgid] = mapping
+        
+        self._by_from[mapping.fromwxid].add(mapping.tgmsgid)
+        
+        # 超出上限时淘汰最早写入的条目，防止历史命中无限累积
+        while len(self._by_tg) > self.cache_max_size:
+            self._cache_discard(next(iter(self._by_tg.values())))
+
+    def _cache_put_absent(self, mapping: MappingResult):
+        """仅在缓存中不存在该tgmsgid时写入，需在所属事件循环中调用"""
+        if mapping.tgmsgid not in self._by_tg:
+            self._cache_put(mapping)
+
+    def _cache_discard(self, mapping: MappingResult):
+        """从内存缓存及索引中移除映射，需在所属事件循环中调用"""
+        if self._by_tg.get(mapping.tgmsgid) is mapping:
+            del self._by_tg[mapping.tgmsgid]
+        if self._by_msgid.get(mapping.msgid) is mapping:
+            del self._by_msgid[mapping.msgid]
+        if self._by_telethon.get(mapping.telethonmsgid) is mapping:
+            del self._by_telethon[mapping.telethonmsgid]
+        
+        tg_ids = self._by_from.get(mapping.fromwxid)
+        if tg_ids is not None:
+            tg_ids.discard(mapping.tgmsgid)
+            if not tg_ids:
+                del self._by_from[mapping.fromwxid]
+
+    def _cache_clear(self):
+        """清空内存缓存，需在所属事件循环中调用"""
+        self._by_tg.clear()
+        self._by_msgid.clear()
+        self._by_telethon.clear()
+        self._by_from.clear()
 
     async def add(self, tg_msg_id: int, from_wx_id: str, to_wx_id: str, 
-                  wx_msg_id: int, client_msg_id: int, create_time: int, 
+                  wx_msg_id: int, client_msg_id: Optional[int], create_time: Optional[int], 
                   content: str, telethon_msg_id: int = 0):
         """
         添加TG消息ID到微信消息的映射
         """
-        today = datetime.now().strftime("%Y-%m-%d")
-        
-        mapping_data = MappingResult({
-            'tgmsgid': int(tg_msg_id),
-            'fromwxid': str(from_wx_id),
-            'towxid': str(to_wx_id),
-            'msgid': int(wx_msg_id),
-            'clientmsgid': int(client_msg_id) if str(client_msg_id).isdigit() else 0,
-            'createtime': int(create_time) if str(create_time).isdigit() else 0,
-            'content': str(content),
-            'telethonmsgid': int(telethon_msg_id)
-        })
+        mapping_data = self._build_mapping(tg_msg_id, from_wx_id, to_wx_id, wx_msg_id,
+                                           client_msg_id, create_time, content, telethon_msg_id)
+        
+        if not self._started:
+            logger.warning(f"⚠️ 映射管理器尚未启动，映射暂存于待写入队列，启动后写入: TG({tg_msg_id}) -> WX({wx_msg_id})")
+        elif not self._flush_running():
+            if self._on_owner_loop():
+                # 批量写入任务未运行时直接写入，避免映射滞留在队列中
+                logger.warning("⚠️ 批量写入任务未运行，映射直接写入数据库")
+                self._cache_put(mapping_data)
+                try:
+                    await self._save_to_database([mapping_data])
+                except Exception as e:
+                    logger.error(f"❌ 添加映射失败: {e}")
+                    self._cache_discard(mapping_data)
+                return
+            logger.error(f"❌ 批量写入任务未运行，映射暂存于待写入队列: TG({tg_msg_id}) -> WX({wx_msg_id})")
+        
+        # 先加入待写入队列，保证调用方随后的查询在缓存更新前也能找到该映射
+        with self._pending_lock:
+            self._pending_writes.append(mapping_data)
+        self._call_in_loop(self._apply_add, mapping_data)
+        
+        logger.debug("成功添加映射: TG(%s) -> WX(%s)", tg_msg_id, wx_msg_id)
+
+    async def add_many(self, rows: List[tuple]):
+        """
+        批量添加映射，在单个事务中写入数据库
+        rows中每一项的参数顺序与add()相同
+        """
+        mappings = [self._build_mapping(*row) for row in rows]
+        if not mappings:
+            return
+        
+        for mapping_data in mappings:
+            self._call_in_loop(self._cache_put, mapping_data)
         
         try:
-            # 1. 先更新内存缓存
-            with self.cache_lock:
-                # 检查是否已存在相同的tg_msg_id，如果存在则更新
-                found = False
-                for i, item in enumerate(self.memory_cache):
-                    if item.tgmsgid == int(tg_msg_id):
-                        self.memory_cache[i] = mapping_data
-                        found = True
-                        break
-                if not found:
-                    self.memory_cache.append(mapping_data)
-                    # 按tgmsgid降序排序
-                    self.memory_cache.sort(key=lambda x: x.tgmsgid, reverse=True)
-            
-            # 2. 保存到数据库
-            await self._save_to_database(today, mapping_data)
-            
-            logger.debug(f"成功添加映射: TG({tg_msg_id}) -> WX({wx_msg_id})")
-            
+            await self._save_to_database(mappings)
+            logger.debug("成功批量添加 %s 条映射", len(mappings))
         except Exception as e:
-            logger.error(f"❌ 添加映射失败: {e}")
+            logger.error(f"❌ 批量添加映射失败: {e}")
             # 如果数据库写入失败，从缓存中移除
-            with self.cache_lock:
-                self.memory_cache = [item for item in self.memory_cache 
-                                   if item.tgmsgid != int(tg_msg_id)]
+            for mapping_data in mappings:
+                self._call_in_loop(self._cache_discard, mapping_data)
+
+    def _build_mapping(self, tg_msg_id: int, from_wx_id: str, to_wx_id: str, 
+                       wx_msg_id: int, client_msg_id: Optional[int], create_time: Optional[int], 
+                       content: str, telethon_msg_id: int = 0) -> MappingResult:
+        """将输入参数规范化为MappingResult"""
+        mapping_data = MappingResult.from_row((
+            int(tg_msg_id),
+            str(from_wx_id),
+            str(to_wx_id),
+            int(wx_msg_id),
+            _safe_int(client_msg_id),
+            _safe_int(create_time),
+            str(content),
+            int(telethon_msg_id)
+        ))
+        
+        # createtime 用于按时间范围查询和清理，缺失时使用当前时间
+        if not mapping_data.createtime:
+            mapping_data.createtime = int(time.time())
+        
+        return mapping_data
 
-    async def _save_to_database(self, date: str, mapping_data: MappingResult):
-        """保存数据到数据库"""
+    def _apply_add(self, mapping_data: MappingResult):
+        """更新内存缓存并唤醒批量写入任务，需在所属事件循环中调用"""
+        # 已存在相同的tg_msg_id时直接覆盖
+        self._cache_put(mapping_data)
+        self._flush_event.set()
+
+    def _flush_running(self) -> bool:
+        """批量写入任务是否在运行"""
+        return self._flush_task is not None and not self._flush_task.done()
+
+    def _find_pending(self, field: str, value: int) -> Optional[MappingResult]:
+        """在尚未写入数据库的映射中查找，同一个键取最后加入的一条"""
+        with self._pending_lock:
+            for mapping_data in reversed(self._pending_writes):
+                if getattr(mapping_data, field) == value:
+                    return mapping_data
+        return None
+
+    async def _refresh_row_count(self):
+        """从数据库重新统计总行数"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # 使用 INSERT OR REPLACE 来处理重复数据
-                await db.execute('''
-                    INSERT OR REPLACE INTO message_mappings 
-                    (tgmsgid, fromwxid, towxid, msgid, clientmsgid, createtime, content, telethonmsgid, date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    mapping_data.tgmsgid,
-                    mapping_data.fromwxid,
-                    mapping_data.towxid,
-                    mapping_data.msgid,
-                    mapping_data.clientmsgid,
-                    mapping_data.createtime,
-                    mapping_data.content,
-                    mapping_data.telethonmsgid,
-                    date
-                ))
+            db = await self._get_reader()
+            async with db.execute(SQL_COUNT_ALL) as cursor:
+                row = await cursor.fetchone()
+            self._row_count = row[0] if row else 0
+        except Exception as e:
+            logger.error(f"❌ 统计映射总数失败: {e}")
+
+    def _on_owner_loop(self) -> bool:
+        """当前是否运行在所属事件循环中（尚未启动时视为是）"""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        return self._loop is None or running_loop is self._loop
+
+    def _call_in_loop(self, callback, *args):
+        """
+        在所属事件循环中执行缓存修改
+        callback模式下消息处理线程有独立的事件循环，来自其他线程的调用通过call_soon_threadsafe转交
+        """
+        if self._on_owner_loop():
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    async def _flush_loop(self):
+        """批量写入循环任务"""
+        while not self._flush_closing:
+            try:
+                await self._flush_event.wait()
+                self._flush_event.clear()
+                
+                # 未达到批量上限时稍等片刻，合并这段时间内的后续写入
+                if not self._flush_closing and len(self._pending_writes) < self.flush_batch_size:
+                    await asyncio.sleep(self.flush_interval)
+                
+                await self._flush_pending()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ 批量写入循环出错: {e}")
+
+    def _on_flush_task_done(self, task: asyncio.Task):
+        """批量写入任务意外退出时记录错误"""
+        if self._flush_closing:
+            return
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            logger.error(f"❌ 批量写入任务异常退出，后续映射将直接写入数据库: {error}")
+        else:
+            logger.error("❌ 批量写入任务已停止，后续映射将直接写入数据库")
+
+    async def _flush_pending(self):
+        """将待写入的映射分批保存到数据库"""
+        async with self._flush_lock:
+            while True:
+                with self._pending_lock:
+                    batch = self._pending_writes[:self.flush_batch_size]
+                
+                if not batch:
+                    return
+                
+                try:
+                    await self._save_to_database(batch)
+                except Exception as e:
+                    logger.error(f"❌ 添加映射失败: {e}")
+                    # 如果数据库写入失败，从缓存中移除
+                    for mapping_data in batch:
+                        self._cache_discard(mapping_data)
+                finally:
+                    # 提交完成后才移出队列，写入期间其他线程仍能在队列中查到；其他线程只会追加，队首即本批
+                    with self._pending_lock:
+                        del self._pending_writes[:len(batch)]
+
+    async def _save_to_database(self, batch: List[MappingResult]):
+        """在单个事务中批量保存数据到数据库"""
+        rows = [
+            (
+                mapping_data.tgmsgid,
+                mapping_data.fromwxid,
+                mapping_data.towxid,
+                mapping_data.msgid,
+                mapping_data.clientmsgid,
+                mapping_data.createtime,
+                mapping_data.content,
+                mapping_data.telethonmsgid
+            )
+            for mapping_data in batch
+        ]
+        
+        tg_ids = list({row[0] for row in rows})
+        
+        try:
+            db = await self._get_writer()
+            async with self._write_lock:
+                await db.execute('BEGIN IMMEDIATE')
+                # 同一事务内先统计已存在的行，UPSERT对它们只是更新，不计入新增行数
+                existing = 0
+                for i in range(0, len(tg_ids), SQL_MAX_VARIABLES):
+                    chunk = tg_ids[i:i + SQL_MAX_VARIABLES]
+                    sql = SQL_COUNT_EXISTING.format(placeholders=','.join('?' * len(chunk)))
+                    async with db.execute(sql, chunk) as cursor:
+                        row = await cursor.fetchone()
+                    existing += row[0] if row else 0
+                
+                # 使用 UPSERT 原地更新重复数据，避免 REPLACE 的删除再插入
+                await db.executemany(SQL_UPSERT, rows)
                 await db.commit()
+            self._row_count += len(tg_ids) - existing
         except Exception as e:
             logger.error(f"❌ 数据库保存失败: {e}")
+            await self._rollback_writer()
             raise
 
     async def tg_to_wx(self, tg_msg_id: int) -> Optional[MappingResult]:
@@ -216,10 +603,9 @@ class MappingManager:
         tg_id_int = int(tg_msg_id)
         
         # 1. 首先检查内存缓存（今日数据）
-        with self.cache_lock:
-            for item in self.memory_cache:
-                if item.tgmsgid == tg_id_int:
-                    return item
+        item = self._by_tg.get(tg_id_int)
+        if item is not None:
+            return item
         
         # 2. 检查数据库（往前搜索指定天数）
         return await self._search_in_database_by_days('tgmsgid', tg_id_int, days=3)
@@ -232,10 +618,9 @@ class MappingManager:
         wx_id_int = int(wx_msg_id)
         
         # 1. 首先检查内存缓存
-        with self.cache_lock:
-            for item in self.memory_cache:
-                if item.msgid == wx_id_int:
-                    return item.tgmsgid
+        item = self._by_msgid.get(wx_id_int)
+        if item is not None:
+            return item.tgmsgid
         
         # 2. 检查数据库
         result = await self._search_in_database_by_days('msgid', wx_id_int, days=3)
@@ -249,10 +634,9 @@ class MappingManager:
         telethon_msg_id_int = int(telethon_msg_id)
         
         # 1. 首先检查内存缓存
-        with self.cache_lock:
-            for item in self.memory_cache:
-                if item.telethonmsgid == telethon_msg_id_int:
-                    return item
+        item = self._by_telethon.get(telethon_msg_id_int)
+        if item is not None:
+            return item
         
         # 2. 检查数据库
         return await self._search_in_database_by_days('telethonmsgid', telethon_msg_id_int, days=3)
@@ -261,49 +645,30 @@ class MappingManager:
         """
         在数据库中按天数范围搜索数据
         """
+        # 尚未写入数据库的映射（其他线程刚添加、所属事件循环还未更新缓存时）
+        pending = self._find_pending(field, value)
+        if pending is not None:
+            return pending
+        
         try:
-            # 生成日期范围
-            today = datetime.now()
-            date_list = []
-            for i in range(1, days + 1):  # 从昨天开始搜索
-                date = (today - timedelta(days=i)).strftime("%Y-%m-%d")
-                date_list.append(date)
+            # 按createtime范围搜索，覆盖往前指定天数
+            cutoff = self._day_start_timestamp(days)
             
-            async with aiosqlite.connect(self.db_path) as db:
-                # 构建查询条件
-                placeholders = ','.join(['?' for _ in date_list])
-                query = f'''
-                    SELECT * FROM message_mappings 
-                    WHERE date IN ({placeholders}) AND {field} = ?
-                    ORDER BY tgmsgid DESC
-                    LIMIT 1
-                '''
-                
-                async with db.execute(query, (*date_list, value)) as cursor:
+            if not self._on_owner_loop():
+                # 其他线程的事件循环（callback模式）中直接同步点查，不占用所属事件循环的只读连接
+                row = self._get_sync_reader().execute(SQL_SEARCH_BY_FIELD[field], (value, cutoff)).fetchone()
+            else:
+                db = await self._get_reader()
+                async with db.execute(SQL_SEARCH_BY_FIELD[field], (value, cutoff)) as cursor:
                     row = await cursor.fetchone()
                     
-                    if row:
-                        result = MappingResult({
-                            'tgmsgid': row[0],
-                            'fromwxid': row[1],
-                            'towxid': row[2],
-                            'msgid': row[3],
-                            'clientmsgid': row[4],
-                            'createtime': row[5],
-                            'content': row[6],
-                            'telethonmsgid': row[7]
-                        })
-                        
-                        # 将历史数据也加入缓存（可选优化）
-                        with self.cache_lock:
-                            # 检查是否已存在，避免重复
-                            exists = any(item.tgmsgid == result.tgmsgid for item in self.memory_cache)
-                            if not exists:
-                                self.memory_cache.append(result)
-                                # 重新排序
-                                self.memory_cache.sort(key=lambda x: x.tgmsgid, reverse=True)
-                        
-                        return result
+            if row:
+                result = MappingResult.from_row(row)
+                    
+                # 将历史数据也加入缓存（可选优化）
+                self._call_in_loop(self._cache_put_absent, result)
+                    
+                return result
         except Exception as e:
             logger.error(f"❌ 数据库搜索失败: {e}")
         
@@ -314,44 +679,23 @@ class MappingManager:
         根据微信用户ID查找相关的TG消息ID列表
         返回tgmsgid整数列表，按tgmsgid降序排序
         """
-        result = []
-        
         # 1. 检查内存缓存
-        with self.cache_lock:
-            for item in self.memory_cache:
-                if item.fromwxid == from_wx_id:
-                    if item.tgmsgid not in result:
-                        result.append(item.tgmsgid)
+        result = set(self._by_from.get(from_wx_id, ()))
         
         # 2. 检查数据库
         try:
-            today = datetime.now()
-            date_list = []
-            for i in range(1, days + 1):
-                date = (today - timedelta(days=i)).strftime("%Y-%m-%d")
-                date_list.append(date)
+            cutoff = self._day_start_timestamp(days)
             
-            async with aiosqlite.connect(self.db_path) as db:
-                placeholders = ','.join(['?' for _ in date_list])
-                query = f'''
-                    SELECT DISTINCT tgmsgid FROM message_mappings 
-                    WHERE date IN ({placeholders}) AND fromwxid = ?
-                    ORDER BY tgmsgid DESC
-                '''
-                
-                async with db.execute(query, (*date_list, from_wx_id)) as cursor:
-                    rows = await cursor.fetchall()
+            db = await self._get_reader()
+            async with db.execute(SQL_SELECT_TGMSGID_BY_FROM, (from_wx_id, cutoff)) as cursor:
+                rows = await cursor.fetchall()
                     
-                    for row in rows:
-                        tg_id = row[0]
-                        if tg_id not in result:
-                            result.append(tg_id)
+                result.update(row[0] for row in rows)
         except Exception as e:
             logger.error(f"❌ 查询用户TG消息失败: {e}")
         
         # 确保结果按tgmsgid降序排序
-        result.sort(reverse=True)
-        return result
+        return sorted(result, reverse=True)
     
     async def _start_cleanup_scheduler(self):
         """启动定期清理调度器"""
@@ -359,9 +703,6 @@ class MappingManager:
             return
         
         try:
-            # 等待数据库初始化完成
-            await asyncio.sleep(5)
-            
             # 启动时执行一次清理（可选）
             await self._perform_scheduled_cleanup(startup=True)
             
@@ -487,30 +828,11 @@ class MappingManager:
         """
         获取映射统计信息
         """
-        cache_count = 0
-        total_mappings = 0
-        
         # 统计内存缓存
-        with self.cache_lock:
-            cache_count = len(self.memory_cache)
+        cache_count = len(self._by_tg)
         
-        # 统计数据库中的数据
-        try:
-            today = datetime.now()
-            date_list = []
-            for i in range(7):  # 统计最近7天
-                date = (today - timedelta(days=i)).strftime("%Y-%m-%d")
-                date_list.append(date)
-            
-            async with aiosqlite.connect(self.db_path) as db:
-                placeholders = ','.join(['?' for _ in date_list])
-                query = f'SELECT COUNT(*) FROM message_mappings WHERE date IN ({placeholders})'
-                
-                async with db.execute(query, date_list) as cursor:
-                    row = await cursor.fetchone()
-                    total_mappings = row[0] if row else 0
-        except Exception as e:
-            logger.error(f"❌ 获取统计信息失败: {e}")
+        # 数据库中的数据（超过保留天数的数据会被定期清理）
+        total_mappings = max(0, self._row_count)
         
         return {
             'total_mappings': total_mappings,
@@ -533,23 +855,84 @@ class MappingManager:
         """
         清理数据库中的旧数据（可选功能）
         """
+        deleted_count = 0
+        
         try:
-            cutoff_date = (datetime.now() - timedelta(days=days_to_keep)).strftime("%Y-%m-%d")
+            cutoff = self._day_start_timestamp(days_to_keep)
             
-            async with aiosqlite.connect(self.db_path) as db:
-                result = await db.execute(
-                    'DELETE FROM message_mappings WHERE date < ?',
-                    (cutoff_date,)
-                )
-                await db.commit()
+            db = await self._get_writer()
+            
+            # 分批删除并逐批提交，避免单个大事务撑大WAL文件，批次之间让出写锁
+            while True:
+                async with self._write_lock:
+                    await db.execute('BEGIN IMMEDIATE')
+                    result = await db.execute(SQL_DELETE_BEFORE_LIMIT, (cutoff, self.cleanup_batch_size))
+                    await db.commit()
+                
+                batch_count = result.rowcount
+                deleted_count += batch_count
+                self._row_count -= batch_count
                 
-                deleted_count = result.rowcount
-                logger.info(f"🗑️ 清理了 {deleted_count} 条旧数据（{days_to_keep}天前）")
+                if batch_count < self.cleanup_batch_size:
+                    break
                 
-                return deleted_count
+                await asyncio.sleep(0)
+            
+            # 删除完成后做一次非阻塞的WAL检查点
+            if deleted_count:
+                async with self._write_lock:
+                    await db.execute('PRAGMA wal_checkpoint(PASSIVE)')
+            
+            logger.info(f"🗑️ 清理了 {deleted_count} 条旧数据（{days_to_keep}天前）")
+            
+            return deleted_count
         except Exception as e:
             logger.error(f"❌ 清理旧数据失败: {e}")
-            return 0
+            await self._rollback_writer()
+            return deleted_count
+
+    async def shutdown(self):
+        """关闭映射管理器，写入剩余数据并释放数据库连接"""
+        await self.stop_cleanup_scheduler()
+        
+        # 停止批量写入任务，并写入队列中剩余的映射
+        self._flush_closing = True
+        self._flush_event.set()
+        if self._flush_task and not self._flush_task.done():
+            try:
+                await self._flush_task
+            except Exception as e:
+                logger.error(f"❌ 停止批量写入任务失败: {e}")
+        await self._flush_pending()
+        
+        connections = self._readers + ([self._writer] if self._writer is not None else [])
+        for db in connections:
+            try:
+                await db.close()
+            except Exception as e:
+                logger.error(f"❌ 关闭数据库连接失败: {e}")
+        
+        for conn in self._sync_readers:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.error(f"❌ 关闭数据库连接失败: {e}")
+        
+        self._writer = None
+        self._readers = []
+        self._reader_cycle = None
+        self._sync_readers = []
+        self._sync_local = threading.local()
+        
+        logger.info("🔴 消息映射管理器已关闭")
 
 # 创建映射管理器实例
-msgid_mapping = MappingManager()
\ No newline at end of file
+msgid_mapping = MappingManager()
+
+async def initialize_message_mapper():
+    """初始化消息映射管理器"""
+    await msgid_mapping.start()
+
+async def shutdown_message_mapper():
+    """关闭消息映射管理器"""
+    await msgid_mapping.shutdown()
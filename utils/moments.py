@@ -1,24 +1,38 @@
+import asyncio
 import base64
 import json
 import logging
 import os
-from datetime import datetime
+import time
 from io import BytesIO
 from typing import List, Dict, Optional, Any
 
 from telegram import InputMediaPhoto, InputMediaVideo
+from telegram.error import BadRequest
 
 import config
 from config import locale
 from utils import message_formatter
 from utils import tools
 from api.wechat_api import wechat_api
-from api.telegram_sender import telegram_sender
+from api.telegram_sender import is_url_fetch_error, telegram_sender
 from utils.contact_manager import contact_manager
 from utils.wechat_to_telegram import _get_or_create_chat
 
 logger = logging.getLogger(__name__)
 
+# 单条朋友圈内媒体并发下载的上限
+MEDIA_DOWNLOAD_CONCURRENCY = 8
+
+# 朋友圈图片URL的优先级（从高清到缩略图）
+MEDIA_URL_PREFERENCE = ("uhd", "hd", "url", "thumb")
+
+# 以图片/视频形式发送的contentStyle
+MEDIA_CONTENT_STYLES = frozenset((1, 15))
+
+# process_moment_data 用到的 TimelineObject 子节点，其余节点不做转换
+MOMENT_TIMELINE_KEYS = ("contentDesc", "ContentObject", "location", "appInfo", "sourceNickName")
+
 class WeChatMomentsExtractor:
     """微信朋友圈增量提取器"""
     
@@ -51,14 +65,17 @@ class WeChatMomentsExtractor:
         return 0
     
     def _save_last_create_time(self, create_time: int):
-        """保存最新的CreateTime到文件"""
-        with open(self.storage_file, 'w') as f:
+        """保存最新的CreateTime到文件（先写临时文件再替换，避免写入中断导致文件损坏）"""
+        tmp_file = self.storage_file + ".tmp"
+        with open(tmp_file, 'w') as f:
             f.write(str(create_time))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.storage_file)
     
     def _timestamp_to_datetime(self, timestamp: int) -> str:
         """将时间戳转换为指定格式的日期时间字符串"""
-        dt = datetime.fromtimestamp(timestamp)
-        return dt.strftime("%Y-%m-%d %H:%M")
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
     
     def get_last_create_time(self) -> int:
         """获取当前存储的最新CreateTime"""
@@ -76,13 +93,15 @@ class WeChatMomentsExtractor:
             return "无记录"
         return self._timestamp_to_datetime(self.last_create_time)
     
-    def extract_incremental_data(self, api_response: Dict[str, Any], cached_last_time: int = None) -> tuple:
+    def extract_incremental_data(self, api_response: Dict[str, Any], cached_last_time: int = None,
+                                 sorted_newest_first: bool = True) -> tuple:
         """
         增量提取朋友圈数据（优化版本）
         
         Args:
             api_response: API返回的完整响应数据
             cached_last_time: 缓存的最后时间戳，如果提供则使用此值而不读取文件
+            sorted_newest_first: ObjectList是否按CreateTime从新到旧排列，是则遇到旧数据即停止扫描
             
         Returns:
             tuple: (new_data_list, max_create_time)
@@ -99,45 +118,161 @@ class WeChatMomentsExtractor:
         # 使用缓存时间戳或从文件读取
         last_create_time = cached_last_time if cached_last_time is not None else self.last_create_time
         
-        # 提取新数据
-        new_data = []
-        max_create_time = last_create_time
-        
+        # 提取新数据：只保留比当前存储的最新时间更新的数据
+        new_items = []
         for item in object_list:
             create_time = item.get("CreateTime", 0)
-            
-            # 只提取比当前存储的最新时间更新的数据
             if create_time > last_create_time:
-                extracted_item = {
-                    "Id": item.get("Id"),
-                    "Username": item.get("Username"),
-                    "CreateTime": self._timestamp_to_datetime(create_time),
-                    "CreateTimeTimestamp": create_time,  # 保留原始时间戳用于比较
-                    "buffer": item.get("ObjectDesc", {}).get("buffer", ""),
-                    "LikeFlag": item.get("LikeFlag", 0),
-                    "LikeCount": item.get("LikeCount", 0)
-                }
-                new_data.append(extracted_item)
-                
-                # 更新最大时间戳
-                if create_time > max_create_time:
-                    max_create_time = create_time
+                new_items.append((item, create_time))
+            elif sorted_newest_first:
+                # 之后的数据都更旧，无需继续扫描
+                break
+        new_data = [self._build_extracted(item, create_time) for item, create_time in new_items]
+        max_create_time = max((create_time for _, create_time in new_items), default=last_create_time)
         
         # 如果有新数据且没有使用缓存参数，更新存储的最新时间
-        if new_data and cached_last_time is None:
+        if new_data and cached_last_time is None and max_create_time != self.last_create_time:
             self._save_last_create_time(max_create_time)
             self.last_create_time = max_create_time
         
         return new_data, max_create_time
     
+    def _build_extracted(self, item: Dict[str, Any], create_time: int) -> Dict[str, Any]:
+        """构造单条增量数据"""
+        return {
+            "Id": item.get("Id"),
+            "Username": item.get("Username"),
+            "CreateTime": self._timestamp_to_datetime(create_time),
+            "CreateTimeTimestamp": create_time,  # 保留原始时间戳用于比较
+            "buffer": item.get("ObjectDesc", {}).get("buffer", ""),
+            "LikeFlag": item.get("LikeFlag", 0),
+            "LikeCount": item.get("LikeCount", 0)
+        }
+    
     def update_last_create_time(self, create_time: int):
-        """更新最新的CreateTime"""
+        """更新最新的CreateTime，未变化时不写文件"""
+        if create_time == self.last_create_time:
+            return
         self._save_last_create_time(create_time)
         self.last_create_time = create_time
 
-async def process_moment_data(data):
+def parse_moment_buffer(buffer_data: str) -> Dict[str, Any]:
+    """
+    解析朋友圈buffer，仅转换处理所需的节点
+    返回结构与 message_formatter.xml_to_json 相同
+    """
+    root = message_formatter.parse_xml_root(buffer_data)
+    
+    timeline_obj = {}
+    for key in MOMENT_TIMELINE_KEYS:
+        element = root.find(key)
+        if element is not None:
+            timeline_obj[key] = message_formatter.element_to_dict(element)
+    
+    return {root.tag: timeline_obj}
+
+def safe_get_value(data, key, default=""):
+    """安全获取字典中的值，空字典视为缺失"""
+    if not isinstance(data, dict):
+        return default
+    value = data.get(key, default)
+    if isinstance(value, dict) and not value:
+        return default
+    return value
+
+def safe_get_dict(data, key, default=None):
+    """安全获取字典中的子字典，类型不符时返回默认值"""
+    if default is None:
+        default = {}
+    if not isinstance(data, dict):
+        return default
+    value = data.get(key, default)
+    return value if isinstance(value, dict) else default
+
+async def _download_moment_image(img_url: str, semaphore: asyncio.Semaphore) -> Optional[BytesIO]:
+    """下载朋友圈图片，失败时返回None"""
+    async with semaphore:
+        try:
+            bytes_io_data, _ = await tools.get_file_from_url(img_url)
+            return bytes_io_data
+        except Exception as e:
+            logger.error(f"处理图片失败: {img_url}, 错误: {e}")
+            return None
+
+async def _download_moment_video(video_url: str, semaphore: asyncio.Semaphore) -> Optional[BytesIO]:
+    """下载朋友圈小视频，失败时返回None"""
+    async with semaphore:
+        try:
+            url_base64 = base64.b64encode(video_url.encode()).decode('utf-8')
+
+            payload = {
+                "Url": url_base64,
+                "Key": "0",
+                "Wxid": config.MY_WXID
+            }
+            video_data = await wechat_api("GET_MOMENT_VIDEO", payload)
+            
+            if not video_data or not video_data.get("Success", True):
+                logger.error(f"获取小视频失败: {video_url}")
+                return None
+            
+            # 从响应中取出base64字符串后直接解码进BytesIO，
+            # 不再保留中间变量，解码完成后原字符串即可释放
+            return BytesIO(base64.b64decode(video_data.pop("Message", "")))
+        except Exception as e:
+            logger.error(f"处理小视频失败: {video_url}, 错误: {e}")
+            return None
+
+def _get_image_url(media_item: Dict[str, Any]) -> Optional[str]:
+    """按优先级获取图片URL"""
+    return next(
+        (url_obj["_text"] for url_key in MEDIA_URL_PREFERENCE
+         if isinstance(url_obj := media_item.get(url_key), dict) and url_obj.get("_text")),
+        None
+    )
+
+def _get_video_url(media_item: Dict[str, Any]) -> Optional[str]:
+    """获取小视频URL"""
+    url_obj = media_item.get("url")
+    return url_obj.get("_text") if isinstance(url_obj, dict) else None
+
+# 媒体type -> (InputMedia类型, URL提取函数, 下载函数或None)；type=2为图片，type=6为微信小视频
+MEDIA_ITEM_HANDLERS = {
+    "2": (InputMediaPhoto, _get_image_url, None),  # 图片交由Telegram直接通过URL获取，不经本地中转
+    "6": (InputMediaVideo, _get_video_url, _download_moment_video),
+}
+
+def _build_media_list(media_sources: List[tuple], caption: str) -> list:
+    """构造媒体组，caption放在第一个媒体上"""
+    return [
+        media_class(media=media, caption=caption if i == 0 else "")
+        for i, (media_class, media) in enumerate(media_sources)
+    ]
+
+async def _download_url_media(media_sources: List[tuple]) -> List[tuple]:
+    """将以URL形式提供的图片下载为BytesIO，已下载的媒体重置读取位置以便再次发送"""
+    semaphore = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+    
+    async def resolve(media):
+        if isinstance(media, str):
+            return await _download_moment_image(media, semaphore)
+        media.seek(0)
+        return media
+    
+    results = await asyncio.gather(*(resolve(media) for _, media in media_sources))
+    return [
+        (media_class, media)
+        for (media_class, _), media in zip(media_sources, results)
+        if media is not None
+    ]
+
+async def process_moment_data(data, contact_cache: Optional[Dict[str, Any]] = None):
     """
     处理朋友圈数据，增强错误处理
+    
+    Args:
+        data: 单条朋友圈数据
+        contact_cache: 批量处理时共享的联系人缓存，避免同一用户重复查询
     """
     try:
         # 1. 统一处理输入数据格式
@@ -160,36 +295,21 @@ async def process_moment_data(data):
         
         # 3. 安全解析JSON
         try:
-            content_json = message_formatter.xml_to_json(buffer_data)
-            if not isinstance(content_json, dict):
-                logger.error(f"XML解析结果不是字典: {type(content_json)}")
-                return False
+            content_json = parse_moment_buffer(buffer_data)
         except Exception as e:
             logger.error(f"XML解析失败: {e}")
             return False
         
         # 获取用户名
-        contact = await contact_manager.get_contact(user_wxid)
+        if contact_cache is None:
+            contact = await contact_manager.get_contact(user_wxid)
+        elif user_wxid in contact_cache:
+            contact = contact_cache[user_wxid]
+        else:
+            contact = contact_cache[user_wxid] = await contact_manager.get_contact(user_wxid)
         user_name = contact.name if contact else "未知用户"
         
-        # 4. 安全获取值的函数（增强版）
-        def safe_get_value(data, key, default=""):
-            if not isinstance(data, dict):
-                return default
-            value = data.get(key, default)
-            if isinstance(value, dict) and not value:
-                return default
-            return value
-        
-        def safe_get_dict(data, key, default=None):
-            if default is None:
-                default = {}
-            if not isinstance(data, dict):
-                return default
-            value = data.get(key, default)
-            return value if isinstance(value, dict) else default
-        
-        # 5. 提取基本信息
+        # 4. 提取基本信息
         timeline_obj = safe_get_dict(content_json, "TimelineObject")
         if not timeline_obj:
             logger.error("TimelineObject 不存在或为空")
@@ -209,7 +329,7 @@ async def process_moment_data(data):
         
         media_list_data = safe_get_dict(content_obj, "mediaList")
         
-        # 6. 提取定位信息
+        # 5. 提取定位信息
         location_data = safe_get_dict(timeline_obj, "location")
         location_info = None
         
@@ -233,8 +353,8 @@ async def process_moment_data(data):
                     "poi_classify_type": safe_get_value(location_data, "poiClassifyType")
                 }
         
-        # 7. 处理媒体数据
-        media_list = []
+        # 6. 处理媒体数据
+        media_sources = []
         caption_parts = []
 
         # 发送者信息
@@ -251,8 +371,8 @@ async def process_moment_data(data):
             if location_text:
                 caption_parts.append(f"<blockquote>{location_text}</blockquote>")
         
-        # 8. 根据content_style处理不同类型的内容
-        if content_style in [1, 15] and media_list_data and "media" in media_list_data:
+        # 7. 根据content_style处理不同类型的内容
+        if content_style in MEDIA_CONTENT_STYLES and media_list_data and "media" in media_list_data:
             # 图片类型
             media_data = media_list_data["media"]
             
@@ -265,64 +385,30 @@ async def process_moment_data(data):
             else:
                 logger.warning(f"未知的媒体数据类型: {type(media_data)}")
             
-            # 处理每张图片
-            for i, media_item in enumerate(media_items):
-                if not isinstance(media_item, dict):
+            # 收集媒体，需要下载的（小视频）并发下载，图片直接使用URL
+            semaphore = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+            media_entries = []
+            
+            for media_item in media_items:
+                handler = MEDIA_ITEM_HANDLERS.get(safe_get_value(media_item, "type"))
+                if handler is None:
                     continue
-                    
-                item_type = safe_get_value(media_item, "type")
-                if item_type == "2":  # type=2表示图片
-                    # 安全获取图片URL
-                    img_url = None
-                    for url_key in ["uhd", "hd", "url", "thumb"]:
-                        url_obj = safe_get_dict(media_item, url_key)
-                        if url_obj:
-                            img_url = safe_get_value(url_obj, "_text")
-                            if img_url:
-                                break
-                    
-                    if img_url:
-                        try:
-                            bytes_io_data, _ = await tools.get_file_from_url(img_url)
-                            caption = "\n".join(caption_parts) if i == 0 and caption_parts else ""
-                            input_media = InputMediaPhoto(media=bytes_io_data, caption=caption)
-                            media_list.append(input_media)
-                        except Exception as e:
-                            logger.error(f"处理图片失败: {img_url}, 错误: {e}")
-                            continue
-                elif item_type == "6":  # type=6表示微信小视频
-                    video_url = None
-                    url_obj = safe_get_dict(media_item, "url")
-                    if url_obj:
-                        video_url = safe_get_value(url_obj, "_text")
-                    
-                    if video_url:
-                        try:
-                            url_base64 = base64.b64encode(video_url.encode()).decode('utf-8')
-
-                            payload = {
-                                "Url": url_base64,
-                                "Key": "0",
-                                "Wxid": config.MY_WXID
-                            }
-                            video_data = await wechat_api("GET_MOMENT_VIDEO", payload)
-                            
-                            if not video_data.get("Success", True):
-                                return
-                            
-                            video_base64 = video_data.get("Message", "")
-                            # 解码为bytes
-                            video_bytes = base64.b64decode(video_base64)
-
-                            # 转换为BytesIO
-                            video_io = BytesIO(video_bytes)
-                            caption = "\n".join(caption_parts) if i == 0 and caption_parts else ""
-                            input_media = InputMediaVideo(media=video_io, caption=caption)
-                            media_list.append(input_media)
-                        except Exception as e:
-                            caption_parts.append(f"<blockquote>[{locale.type(43)}: {finder_nickname}]</blockquote>")
-                            logger.error(f"处理小视频失败: {video_url}, 错误: {e}")
-                            continue
+                
+                media_class, get_url, download = handler
+                media_url = get_url(media_item)
+                if media_url:
+                    media_entries.append((media_class, media_url, download))
+            
+            results = iter(await asyncio.gather(*(
+                download(media_url, semaphore)
+                for _, media_url, download in media_entries if download is not None
+            )))
+            
+            # 按原顺序保留可用的媒体，caption在全部拼接完成后再附加
+            for media_class, media_url, download in media_entries:
+                media = media_url if download is None else next(results)
+                if media is not None:
+                    media_sources.append((media_class, media))
             
         else:
             # 其他分享内容类型
@@ -351,16 +437,26 @@ async def process_moment_data(data):
                 if finder_desc:
                     caption_parts.append(finder_desc)
         
-        # 9. 统一合并caption
+        # 8. 统一合并caption
         full_caption = "\n".join(caption_parts) if caption_parts else ""
 
-        # 10. 发送消息
+        # 9. 发送消息
         chat_id = await _get_or_create_chat("wechat_moments", locale.common("moments"), "")
         if not chat_id:
             return False
             
-        if media_list:
-            await telegram_sender.send_media_group(chat_id, media_list)
+        if media_sources:
+            try:
+                await telegram_sender.send_media_group(chat_id, _build_media_list(media_sources, full_caption))
+            except BadRequest as e:
+                # 仅在Telegram无法通过URL获取图片时（如CDN签名过期）下载后重新发送
+                if not is_url_fetch_error(e):
+                    raise
+                logger.warning(f"⚠️ 图片URL发送失败，改为下载后发送: {e}")
+                media_sources = await _download_url_media(media_sources)
+                if not media_sources:
+                    raise
+                await telegram_sender.send_media_group(chat_id, _build_media_list(media_sources, full_caption))
         elif full_caption:
             await telegram_sender.send_text(chat_id, full_caption)
         else:
@@ -16,7 +16,7 @@ from config import locale
 from api.wechat_api import wechat_api
 from api.telegram_sender import telegram_sender
 from service.telethon_client import get_client
-from utils import tools
+from utils import message_formatter, tools
 from utils.contact_manager import contact_manager
 from utils.message_mapper import msgid_mapping
 from utils.sticker_converter import converter
@@ -81,7 +81,7 @@ async def forward_telegram_to_wx(chat_id: str, message, telethon_msg_id = None)
     to_wxid = await contact_manager.get_wxid_by_chatid(chat_id)
     
     if not to_wxid:
-        logger.error(f"未找到chat_id {chat_id} 对应的微信ID")
+        logger.error("未找到chat_id %s 对应的微信ID", chat_id)
         return False, locale.command('no_contacts')
     
     try:
@@ -95,26 +95,15 @@ async def forward_telegram_to_wx(chat_id: str, message, telethon_msg_id = None)
                 return
             
             # 判断是否为单纯文本信息
-            msg_entities = message.entities or []
-            is_url = False
-            entity = None
-
-            if msg_entities and len(msg_entities) > 0:
-                entity = msg_entities[0]
-                # 查找第一个链接实体
-                for item in msg_entities:
-                    if item.type == 'text_link' or (item.type == 'url' and item.offset == 0 and item.length == len(text.strip())):
-                        entity = item
-                        is_url = True
-                        break
+            text_kind, entity = _classify_entities(text, message.entities)
     
             if message.reply_to_message:
                 # 回复消息
                 send_result = await _send_telegram_reply(to_wxid, message)
-            elif msg_entities and is_url:
+            elif text_kind == "link":
                 # 链接消息
-                send_result = await _send_telegram_link(to_wxid, message)
-            elif msg_entities and entity and entity.type == "expandable_blockquote":
+                send_result = await _send_telegram_link(to_wxid, message, entity)
+            elif text_kind == "expandable_blockquote":
                 # 转发群聊消息时去除联系人
                 text = text.split('\n', 1)[1]
                 send_result = await _send_telegram_text(to_wxid, text)
@@ -167,7 +156,7 @@ async def forward_telegram_to_wx(chat_id: str, message, telethon_msg_id = None)
             return send_result, f"API{locale.common('error')}"
             
     except Exception as e:
-        logger.error(f"转发消息时出错: {e}")            
+        logger.error("转发消息时出错: %s", e)            
         return False, str(e)
 
 
@@ -203,7 +192,7 @@ async def _send_telegram_photo(to_wxid: str, photo: list) -> bool:
         
         return await wechat_api("SEND_IMAGE", payload)
     except Exception as e:
-        logger.error(f"处理图片时出错: {e}")
+        logger.error("处理图片时出错: %s", e)
         return False
 
 
@@ -219,8 +208,11 @@ async def _send_telegram_video(to_wxid: str, video, chat_id, telethon_msg_id) ->
     duration = video.duration
     
     try:
-        thumb_base64 = await tools.get_telegram_file(thumb_file_id)
-        video_base64 = await tools.get_telegram_file(file_obj=video, chat_id=int(chat_id), message_id=telethon_msg_id)
+        # 缩略图与视频并发下载
+        thumb_base64, video_base64 = await asyncio.gather(
+            tools.get_telegram_file(thumb_file_id),
+            tools.get_telegram_file(file_obj=video, chat_id=int(chat_id), message_id=telethon_msg_id)
+        )
 
         payload = {
             "Base64": video_base64,
@@ -232,7 +224,7 @@ async def _send_telegram_video(to_wxid: str, video, chat_id, telethon_msg_id) ->
         
         return await wechat_api("SEND_VIDEO", payload, timeout=300)
     except Exception as e:
-        logger.error(f"处理视频时出错: {e}")
+        logger.error("处理视频时出错: %s", e)
         return False
 
 async def _send_telegram_sticker(to_wxid: str, sticker) -> bool:
@@ -281,7 +273,7 @@ async def _send_telegram_sticker(to_wxid: str, sticker) -> bool:
                     gif_path = await converter.webp_to_gif(sticker_path)
                 
                 if not gif_path:
-                    logger.error(f"转换失败: {sticker_path}")
+                    logger.error("转换失败: %s", sticker_path)
                     return False
                 
                 # 转换成功，准备发送
@@ -299,7 +291,7 @@ async def _send_telegram_sticker(to_wxid: str, sticker) -> bool:
                 }
                 
             except Exception as e:
-                logger.error(f"下载并转换贴纸失败: {e}")
+                logger.error("下载并转换贴纸失败: %s", e)
                 return False
         
         # 执行发送操作
@@ -309,10 +301,10 @@ async def _send_telegram_sticker(to_wxid: str, sticker) -> bool:
             return result
         else:
             err_msg = result.get("Message", {})
-            logger.error(f"贴纸发送失败: {err_msg}")
+            logger.error("贴纸发送失败: %s", err_msg)
     
     except Exception as e:
-        logger.error(f"处理贴纸时出错: {e}")
+        logger.error("处理贴纸时出错: %s", e)
         return False
 
 async def _send_telegram_voice(to_wxid: str, voice):
@@ -366,7 +358,7 @@ async def _send_telegram_voice(to_wxid: str, voice):
         return await wechat_api("SEND_VOICE", payload)
     
     except Exception as e:
-        logger.error(f"处理Telegram语音消息失败: {e}")
+        logger.error("处理Telegram语音消息失败: %s", e)
         logger.error(traceback.format_exc())
         return False
     finally:
@@ -380,9 +372,9 @@ async def _send_telegram_voice(to_wxid: str, voice):
             if file_path and os.path.exists(file_path):
                 try:
                     os.remove(file_path)
-                    logger.debug(f"清理{file_type}: {file_path}")
+                    logger.debug("清理%s: %s", file_type, file_path)
                 except Exception as e:
-                    logger.warning(f"清理{file_type}失败 {file_path}: {e}")
+                    logger.warning("清理%s失败 %s: %s", file_type, file_path, e)
 
 async def _send_telegram_document(to_wxid: str, document, chat_id, telethon_msg_id) -> bool:
     """发送文档消息到微信"""
@@ -400,7 +392,7 @@ async def _send_telegram_document(to_wxid: str, document, chat_id, telethon_msg_
         # 检查文件大小限制
         max_size = 50 * 1024 * 1024  # 50MB
         if file_size and file_size > max_size:
-            logger.error(f"文件太大: {file_size} bytes (限制: {max_size} bytes)")
+            logger.error("文件太大: %s bytes (限制: %s bytes)", file_size, max_size)
             return False
         
         # 下载文件并转换为base64
@@ -424,7 +416,7 @@ async def _send_telegram_document(to_wxid: str, document, chat_id, telethon_msg_
         return upload_file
         
     except Exception as e:
-        logger.error(f"处理文档时出错: {e}")
+        logger.error("处理文档时出错: %s", e)
         return False
 
 async def _send_telegram_location(to_wxid: str, message) -> bool:
@@ -468,11 +460,17 @@ async def _send_telegram_reply(to_wxid: str, message):
         reply_to_message_id = reply_to_message.message_id
         reply_to_wx_msgid = await msgid_mapping.tg_to_wx(reply_to_message_id)
         if reply_to_wx_msgid is None:
-            logger.warning(f"找不到TG消息ID {reply_to_message_id} 对应的微信消息映射")
+            logger.warning("找不到TG消息ID %s 对应的微信消息映射", reply_to_message_id)
             # 处理找不到映射的情况，可能需要跳过或使用默认值
             return await _send_telegram_text(to_wxid, send_text)
         reply_to_text = reply_to_message.text or ""
-        reply_xml = f"""<appmsg appid="" sdkver="0"><title>{send_text}</title><des /><action /><type>57</type><showtype>0</showtype><soundtype>0</soundtype><mediatagname /><messageext /><messageaction /><content /><contentattr>0</contentattr><url /><lowurl /><dataurl /><lowdataurl /><songalbumurl /><songlyric /><appattach><totallen>0</totallen><attachid /><emoticonmd5 /><fileext /><aeskey /></appattach><extinfo /><sourceusername /><sourcedisplayname /><thumburl /><md5 /><statextstr /><refermsg><content>{reply_to_text}</content><type>1</type><svrid>{int(reply_to_wx_msgid.msgid)}</svrid><chatusr>{reply_to_wx_msgid.fromwxid}</chatusr><fromusr>${to_wxid}</fromusr></refermsg></appmsg>"""
+        reply_xml = message_formatter.REPLY_APPMSG_XML.format(
+            title=message_formatter.xml_escape(send_text),
+            content=message_formatter.xml_escape(reply_to_text),
+            svrid=int(reply_to_wx_msgid.msgid),
+            chatusr=message_formatter.xml_escape(reply_to_wx_msgid.fromwxid),
+            fromusr=message_formatter.xml_escape(to_wxid)
+        )
         payload = {
             "ToWxid": to_wxid,
             "Type": 49,
@@ -481,44 +479,56 @@ async def _send_telegram_reply(to_wxid: str, message):
         }
         return await wechat_api("SEND_APP", payload)
     except Exception as e:
-        logger.error(f"处理回复消息时出错: {e}")
+        logger.error("处理回复消息时出错: %s", e)
         return False
 
 
-async def _send_telegram_link(to_wxid: str, message):
-    """处理链接信息"""
-    text = message.text
+def _classify_entities(text: str, msg_entities) -> tuple:
+    """
+    根据消息实体判断文本消息类型（只扫描一次实体列表）
+    
+    Returns:
+        tuple: (类型, 实体)，类型为 "link"、"expandable_blockquote" 或 None
+    """
+    if not msg_entities:
+        return None, None
+    
+    # 查找第一个链接实体（文字链接，或占满整条消息的URL）
+    full_length = len(text.strip())
+    for item in msg_entities:
+        if item.type == 'text_link' or (item.type == 'url' and item.offset == 0 and item.length == full_length):
+            return "link", item
+    
+    entity = msg_entities[0]
+    if entity.type == "expandable_blockquote":
+        return "expandable_blockquote", entity
+    return None, entity
 
-    msg_entities = message.entities or []
-    if msg_entities and len(msg_entities) > 0:
-        entity = msg_entities[0]
-        # 查找第一个链接实体
-        for item in msg_entities:
-            if item.type in ['text_link', 'url']:
-                entity = item
-                break
-
-        if entity.type == 'text_link' and entity.url:
-            link_title = message.text
-            link_url = entity.url
-            link_desc = ''
-        elif entity.type == 'url':
-            link_title = '分享链接'
-            offset = entity.offset
-            length = entity.length
-            link_url = message.text[offset:offset + length]
-            link_desc = link_url
-        
-        if link_title and link_url:
-            text = f"<appmsg><title>{link_title}</title><des>{link_desc}</des><type>5</type><url>{link_url}</url><thumburl></thumburl></appmsg>"
+async def _send_telegram_link(to_wxid: str, message, entity):
+    """处理链接信息，entity为_classify_entities找到的链接实体"""
+    text = message.text
+    link_title = link_url = link_desc = ''
+
+    if entity.type == 'text_link' and entity.url:
+        link_title = text
+        link_url = entity.url
+    elif entity.type == 'url':
+        link_title = '分享链接'
+        link_url = message_formatter.normalize_link_url(text[entity.offset:entity.offset + entity.length])
+        link_desc = link_url
+    
+    if link_title and link_url:
+        text = message_formatter.LINK_APPMSG_XML.format(
+            title=message_formatter.xml_escape(link_title), des=message_formatter.xml_escape(link_desc), url=message_formatter.xml_escape(link_url)
+        )
 
-        payload = {
-            "ToWxid": to_wxid,
-            "Type": 49,
-            "Wxid": config.MY_WXID,
-            "Xml": text
-        }
-        return await wechat_api('SEND_APP', payload)
+    payload = {
+        "ToWxid": to_wxid,
+        "Type": 49,
+        "Wxid": config.MY_WXID,
+        "Xml": text
+    }
+    return await wechat_api('SEND_APP', payload)
 
 async def revoke_by_telegram_bot_command(chat_id, message):
     try:
@@ -550,7 +560,7 @@ async def revoke_by_telegram_bot_command(chat_id, message):
         await telegram_sender.delete_message(chat_id, message.message_id)
         
     except Exception as e:
-        logger.error(f"处理消息删除逻辑时出错: {e}")
+        logger.error("处理消息删除逻辑时出错: %s", e)
 
 
 async def _download_telegram_voice(file_id: str, voice_dir: str) -> str:
@@ -595,7 +605,7 @@ async def _download_telegram_voice(file_id: str, voice_dir: str) -> str:
         return local_voice_path
         
     except Exception as e:
-        logger.error(f"下载语音文件失败 (file_id: {file_id}): {e}")
+        logger.error("下载语音文件失败 (file_id: %s): %s", file_id, e)
         logger.error(traceback.format_exc())
         return None
 
@@ -631,10 +641,10 @@ async def _convert_voice_to_silk(input_path: str, file_id: str, voice_dir: str)
             )
             return True
         except ffmpeg.Error as e:
-            logger.error(f"ffmpeg转换失败: {e.stderr.decode() if e.stderr else str(e)}")
+            logger.error("ffmpeg转换失败: %s", e.stderr.decode() if e.stderr else str(e))
             return False
         except Exception as e:
-            logger.error(f"ffmpeg转换过程中出现异常: {e}")
+            logger.error("ffmpeg转换过程中出现异常: %s", e)
             return False
     
     def _pilk_convert(pcm_path: str, silk_path: str) -> Optional[float]:
@@ -648,7 +658,7 @@ async def _convert_voice_to_silk(input_path: str, file_id: str, voice_dir: str)
             )
             return silk_duration
         except Exception as e:
-            logger.error(f"pilk转换失败: {e}")
+            logger.error("pilk转换失败: %s", e)
             return None
     
     def _file_exists_and_size(file_path: str) -> tuple[bool, int]:
@@ -664,7 +674,7 @@ async def _convert_voice_to_silk(input_path: str, file_id: str, voice_dir: str)
                 os.remove(file_path)
                 return True
         except Exception as e:
-            logger.warning(f"删除文件失败 {file_path}: {e}")
+            logger.warning("删除文件失败 %s: %s", file_path, e)
         return False
     
     try:
@@ -714,7 +724,7 @@ async def _convert_voice_to_silk(input_path: str, file_id: str, voice_dir: str)
         return silk_path
         
     except Exception as e:
-        logger.error(f"转换过程中出现异常: {e}")
+        logger.error("转换过程中出现异常: %s", e)
         logger.error(traceback.format_exc())
         return None
     finally:
@@ -723,9 +733,9 @@ async def _convert_voice_to_silk(input_path: str, file_id: str, voice_dir: str)
             try:
                 removed = await asyncio.to_thread(_remove_file, pcm_path)
                 if removed:
-                    logger.debug(f"清理PCM临时文件: {pcm_path}")
+                    logger.debug("清理PCM临时文件: %s", pcm_path)
             except Exception as e:
-                logger.warning(f"清理PCM临时文件失败 {pcm_path}: {e}")
+                logger.warning("清理PCM临时文件失败 %s: %s", pcm_path, e)
 
 async def _download_telegram_sticker(sticker) -> str:
     """从 Telegram Update 对象下载贴纸到本地"""
@@ -770,7 +780,7 @@ async def _download_telegram_sticker(sticker) -> str:
         
         # 验证下载
         if not os.path.exists(local_path) or os.path.getsize(local_path) == 0:
-            logger.error(f"下载失败或文件为空: {local_path}")
+            logger.error("下载失败或文件为空: %s", local_path)
             if os.path.exists(local_path):
                 os.remove(local_path)
             return None
@@ -780,9 +790,15 @@ async def _download_telegram_sticker(sticker) -> str:
         return local_path
         
     except Exception as e:
-        logger.error(f"下载贴纸失败: {e}")
+        logger.error("下载贴纸失败: %s", e)
         return None
 
+# 发送接口返回字段的候选键（各接口大小写不统一），嵌套键预先拆分为路径元组
+NEW_MSGID_KEYS = ('NewMsgId', 'Newmsgid', 'newMsgId')
+CREATE_TIME_KEYS = ('Createtime', 'createtime', 'createTime', 'CreateTime')
+TO_USER_NAME_KEYS = (('ToUsetName', 'string'), ('toUserName', 'string'), ('ToUserName', 'string'), 'toUserName', 'ToUserName')
+CLIENT_MSGID_KEYS = ('ClientMsgid', ('ClientImgId', 'string'), 'clientmsgid', 'clientMsgId')
+
 # 添加msgid映射
 async def add_send_msgid(wx_api_response, tg_msgid, telethon_msg_id: int = 0, to_wxid: str = None):
     
@@ -806,13 +822,13 @@ async def add_send_msgid(wx_api_response, tg_msgid, telethon_msg_id: int = 0, to
         response_data = data
 
     if response_data:
-        new_msg_id = tools.multi_get(response_data, 'NewMsgId', 'Newmsgid', 'newMsgId')
-        create_time = tools.multi_get(response_data, 'Createtime', 'createtime', 'createTime', 'CreateTime')
+        new_msg_id = tools.multi_get(response_data, *NEW_MSGID_KEYS)
+        create_time = tools.multi_get(response_data, *CREATE_TIME_KEYS)
 
-        to_uesr_name = tools.multi_get(response_data, 'ToUsetName.string', 'toUserName.string', 'ToUserName.string', 'toUserName', 'ToUserName')
+        to_uesr_name = tools.multi_get(response_data, *TO_USER_NAME_KEYS)
         to_wx_id = to_uesr_name if to_uesr_name else to_wxid
         
-        client_msgid = tools.multi_get(response_data, 'ClientMsgid', 'ClientImgId.string', 'clientmsgid', 'clientMsgId')
+        client_msgid = tools.multi_get(response_data, *CLIENT_MSGID_KEYS)
         client_msgid_str = str(client_msgid) if client_msgid is not None else ""
         client_msg_id = client_msgid_str.rsplit('_', 1)[1] if '_' in client_msgid_str else client_msgid_str
 
@@ -828,7 +844,7 @@ async def add_send_msgid(wx_api_response, tg_msgid, telethon_msg_id: int = 0, to
                 telethon_msg_id=telethon_msg_id
             )
         else:
-            logger.warning(f"NewMsgId 不存在: {response_data}")
+            logger.warning("NewMsgId 不存在: %s", response_data)
     else:
         logger.warning("消息列表为空")
 
@@ -879,7 +895,7 @@ async def revoke_telethon(event):
             await wechat_api("REVOKE", payload)
         
     except Exception as e:
-        logger.error(f"处理消息删除逻辑时出错: {e}")
+        logger.error("处理消息删除逻辑时出错: %s", e)
 
 
 # 定义emoji列表
@@ -18,6 +18,7 @@ from api import wechat_contacts, wechat_login
 from api.wechat_api import wechat_api
 from api.telegram_sender import telegram_sender
 from service.telethon_client import get_client
+from utils import message_formatter, tools
 from utils.contact_manager import contact_manager
 from utils.message_mapper import msgid_mapping
 from utils.sticker_mapper import get_sticker_info
@@ -25,6 +26,15 @@ from utils.telegram_to_wechat import add_send_msgid
 
 logger = logging.getLogger(__name__)
 
+# 微信内置emoji名称，收到同名文本时按emoji发送
+WECHAT_EMOJI_NAMES = frozenset(("微笑", "撇嘴", "色", "发呆", "得意", "流泪", "害羞", "闭嘴", "睡", "大哭", "尴尬", "发怒", "调皮", "呲牙", "惊讶", "难过", "囧", "抓狂", "吐", "偷笑", "愉快", "白眼", "傲慢", "困", "惊恐", "憨笑", "悠闲", "咒骂", "疑问", "嘘", "晕", "衰", "骷髅", "敲打", "再见", "擦汗", "抠鼻", "鼓掌", "坏笑", "右哼哼", "鄙视", "委屈", "快哭了", "阴险", "亲亲", "可怜", "笑脸", "生病", "脸红", "破涕为笑", "恐惧", "失望", "无语", "嘿哈", "捂脸", "奸笑", "机智", "皱眉", "耶", "吃瓜", "加油", "汗", "天啊", "Emm", "社会社会", "旺柴", "好的", "打脸", "哇", "翻白眼", "666", "让我看看", "叹气", "苦涩", "裂开", "嘴唇", "爱心", "心碎", "拥抱", "强", "弱", "握手", "胜利", "抱拳", "勾引", "拳头", "OK", "合十", "啤酒", "咖啡", "蛋糕", "玫瑰", "凋谢", "菜刀", "炸弹", "便便", "月亮", "太阳", "庆祝", "礼物", "红包", "发", "福", "烟花", "爆竹", "猪头", "跳跳", "发抖", "转圈", "Smile", "Grimace", "Drool", "Scowl", "Chill", "Sob", "Shy", "Shutup", "Sleep", "Cry", "Awkward", "Pout", "Wink", "Grin", "Surprised", "Frown", "Tension", "Scream", "Puke", "Chuckle", "Joyful", "Slight", "Smug", "Drowsy", "Panic", "Laugh", "Loafer", "Scold", "Doubt", "Shhh", "Dizzy", "BadLuck", "Skull", "Hammer", "Bye", "Relief", "DigNose", "Clap", "Trick", "Bah！R", "Lookdown", "Wronged", "Puling", "Sly", "Kiss", "Whimper", "Happy", "Sick", "Flushed", "Lol", "Terror", "Let Down", "Duh", "Hey", "Facepalm", "Smirk", "Smart", "Concerned", "Yeah!", "Onlooker", "GoForIt", "Sweats", "OMG", "Respect", "Doge", "NoProb", "MyBad", "Wow", "Boring", "Awesome", "LetMeSee", "Sigh", "Hurt", "Broken", "Lip", "Heart", "BrokenHeart", "Hug", "Strong", "Weak", "Shake", "Victory", "Salute", "Beckon", "Fist", "Worship", "Beer", "Coffee", "Cake", "Rose", "Wilt", "Cleaver", "Bomb", "Poop", "Moon", "Sun", "Party", "Gift", "Packet", "Rich", "Blessing", "Fireworks", "Firecracker", "Pig", "Waddle", "Tremble", "Twirl"))
+
+# 发送视频时使用的黑色JPEG缩略图
+BLACK_THUMB_BASE64 = "/9j/4AAQSkZJRgABAQEASABIAAD/2wBDAAUDBAQEAwUEBAQFBQUGBwwIBwcHBw8LCwkMEQ8SEhEPERETFhwXExQaFRERGCEYGh0dHx8fExciJCIeJBweHx7/2wBDAQUFBQcGBw4ICA4eFBEUHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh7/wAARCAFAALQDASIAAhEBAxEB/8QAGAABAQEBAQAAAAAAAAAAAAAAAAECAwj/xAAgEAEBAQADAAICAwAAAAAAAAAAAREhMUECUSJhcYGR/8QAFgEBAQEAAAAAAAAAAAAAAAAAAAEC/8QAGBEBAQEBAQAAAAAAAAAAAAAAABEBMSH/2gAMAwEAAhEDEQA/APG9E1RrcAAqXmqkqiQAEgEAhSAESrAoCVUwazSFWJQ31AaEjItQMBoGqAtGcQCikAgFFqAAXoAAAATQE0MUJcPlZQpQBWVhQFEAUFzjRMQFgqBSAAAFnAAFCgbxhRL2C1MJeVEiZypKBACgmlKUKS4GgVQAwJD4rgqKiwEvYvqYBYQvKzoEFqQAvJQAKABSCaQEoiA0CaIA0LMxKAT+AotGmavgqXsL2AAQAvZYACxAA8KCWmkUTRloEToq1KCAA2UhQQoAAvxSiUXSq0hIAFoHXAJVX/UvIytRdQDABSpCoItRpKCAA3O0rXH2zQAAGpfWRnQ+V5KUpQBc40q1PQClJQFpSgKgBaCVGigRMWpoILoDVKGgheydroJFqeWjOh6XfoWVBDzCNAyAALc8QAPDzVoFIXtrBDtcwBk5+mqlBRkBqi+IAAABE3gBBkIuliUACAAQguftCgAUMC9JixK2GFVKCAA6eJU+gA9IAAsTeCL2gyLv5U1AACgALQBIbtFDZ9CAlUbEqNVkF0QBrwOyABD0CTKUATDFE0DQrMD0vB6AJVKAVPNWgkMUBLMVKijVSlRoAAaKGaAHoAAALn0nVA/sACgJuALUvCQLpC3E7qCzASgVaAJhSo2AAN1FjMGtISEWjIAAUhAABYFv6SkEW9ltrLUTRKi0qCeCxQTxFhKCxlq3GWgvNABqXAzkFoCUFGWgSKFCAkWAl7IvoAQAgSFTP2EUqQxIhTFgsGTwPAAAa0tCgkWJFFTpfEqilSF5qgkX0ATVElwFTtUwDTVjIALREWHaAB4CAANJVqUXCFWFBIasBU1Uw6BWV0gKy1GQWKmFAixkAaSFAqCzsEFqCAARe1vRChjLVSnYqpEWAoVNBUqALUFssAwpDQRYICxFhQQACgAAA0y1UomI0mKKkMWsgAsBFhFgMi+lBFpQC1ABYUiAAAFEAFwBYqYUZWJSoKAsFQWoA0yugXEXEAAAAAAAAADAAAGqlJcWiZjIAosSL0CAsBBe1wEMqLQQKmLooCAACxAASqEAAH//2Q=="
+
+# 作为链接消息发送的实体类型
+LINK_ENTITY_TYPES = (MessageEntityTextUrl, MessageEntityUrl)
+
 # ==================== Telethon相关方法 ====================
 # 处理Telethon更新中的消息
 async def process_telethon_update(event: NewMessage.Event) -> None:
@@ -57,61 +67,19 @@ async def process_telethon_update(event: NewMessage.Event) -> None:
         # 判断消息类型并处理
         if message.text:
             message_text = message.text
-            # 更新联系人信息
-            if message_text.startswith('/update'):
-                to_wxid = await contact_manager.get_wxid_by_chatid(chat_id)
-                if not to_wxid:
-                    return False
-                user_info = wechat_contacts.get_user_info(to_wxid)
-                # 更新TG群组
-                await wechat_contacts.update_info(chat_id, user_info.name, user_info.avatar_url)
-                # 更新映射文件
-                await contact_manager.update_contact_by_chatid(chat_id, {
-                    "name": user_info.name,
-                    "avatar_url": user_info.avatar_url
-                })
-                return
-            
-            # 删除联系人数据
-            if message_text.startswith("/unbind"):
-                to_wxid = await contact_manager.get_wxid_by_chatid(chat_id)
-                unbind_result = await contact_manager.delete_contact(to_wxid)
-                if unbind_result:
-                    await telegram_sender.send_text(chat_id, locale.command("unbind_successed"))
-                return
-            
-            # 撤回
-            if message_text.startswith("/rm") or message_text.startswith("/revoke"):
-                if message.reply_to_msg_id:
-                    await revoke_telethon(chat_id, message, client)
-                    return
-            
-            # 是否接受信息
-            if message_text.startswith("/message"):
-                await contact_manager.update_contact_by_chatid(chat_id, {"is_receive": "toggle"})
-                contact_now = await contact_manager.get_contact_by_chatid(chat_id)
-                if contact_now["isReceive"]:
-                    await telegram_sender.send_text(chat_id, locale.command("receive_on"))
-                else:
-                    await telegram_sender.send_text(chat_id, locale.command("receive_off"))
-                return
-            
-            # 执行二次登录
-            if message_text.startswith("/login"):
-                relogin = wechat_login.twice_login(config.MY_WXID)
-                if relogin.get('Message') == "登录成功":
-                    await telegram_sender.send_text(chat_id, locale.common("twice_login_success"))
-                else:
-                    await telegram_sender.send_text(chat_id, locale.common("twice_login_fail"))
-                return
-            
-            # 发送微信emoji
+            # 命令消息：取第一个词（去掉@机器人后缀）查表分发
             if message_text.startswith('/'):
+                command = message_text.split(maxsplit=1)[0].split('@', 1)[0]
+                handler = TELETHON_COMMAND_HANDLERS.get(command)
+                if handler is not None and await handler(chat_id, message, client):
+                    return
+                
+                # 发送微信emoji
                 emoji_text = '[' + message_text[1:] + ']'
                 to_wxid = await contact_manager.get_wxid_by_chatid(chat_id)
                 return await _send_telethon_text(to_wxid, emoji_text)
 
-            if message_text in ["微笑", "撇嘴", "色", "发呆", "得意", "流泪", "害羞", "闭嘴", "睡", "大哭", "尴尬", "发怒", "调皮", "呲牙", "惊讶", "难过", "囧", "抓狂", "吐", "偷笑", "愉快", "白眼", "傲慢", "困", "惊恐", "憨笑", "悠闲", "咒骂", "疑问", "嘘", "晕", "衰", "骷髅", "敲打", "再见", "擦汗", "抠鼻", "鼓掌", "坏笑", "右哼哼", "鄙视", "委屈", "快哭了", "阴险", "亲亲", "可怜", "笑脸", "生病", "脸红", "破涕为笑", "恐惧", "失望", "无语", "嘿哈", "捂脸", "奸笑", "机智", "皱眉", "耶", "吃瓜", "加油", "汗", "天啊", "Emm", "社会社会", "旺柴", "好的", "打脸", "哇", "翻白眼", "666", "让我看看", "叹气", "苦涩", "裂开", "嘴唇", "爱心", "心碎", "拥抱", "强", "弱", "握手", "胜利", "抱拳", "勾引", "拳头", "OK", "合十", "啤酒", "咖啡", "蛋糕", "玫瑰", "凋谢", "菜刀", "炸弹", "便便", "月亮", "太阳", "庆祝", "礼物", "红包", "发", "福", "烟花", "爆竹", "猪头", "跳跳", "发抖", "转圈", "Smile", "Grimace", "Drool", "Scowl", "Chill", "Sob", "Shy", "Shutup", "Sleep", "Cry", "Awkward", "Pout", "Wink", "Grin", "Surprised", "Frown", "Tension", "Scream", "Puke", "Chuckle", "Joyful", "Slight", "Smug", "Drowsy", "Panic", "Laugh", "Loafer", "Scold", "Doubt", "Shhh", "Dizzy", "BadLuck", "Skull", "Hammer", "Bye", "Relief", "DigNose", "Clap", "Trick", "Bah！R", "Lookdown", "Wronged", "Puling", "Sly", "Kiss", "Whimper", "Happy", "Sick", "Flushed", "Lol", "Terror", "Let Down", "Duh", "Hey", "Facepalm", "Smirk", "Smart", "Concerned", "Yeah!", "Onlooker", "GoForIt", "Sweats", "OMG", "Respect", "Doge", "NoProb", "MyBad", "Wow", "Boring", "Awesome", "LetMeSee", "Sigh", "Hurt", "Broken", "Lip", "Heart", "BrokenHeart", "Hug", "Strong", "Weak", "Shake", "Victory", "Salute", "Beckon", "Fist", "Worship", "Beer", "Coffee", "Cake", "Rose", "Wilt", "Cleaver", "Bomb", "Poop", "Moon", "Sun", "Party", "Gift", "Packet", "Rich", "Blessing", "Fireworks", "Firecracker", "Pig", "Waddle", "Tremble", "Twirl"]:
+            if message_text in WECHAT_EMOJI_NAMES:
                 to_wxid = await contact_manager.get_wxid_by_chatid(chat_id)
                 return await _send_telethon_text(to_wxid, f"[{message_text}]")
 
@@ -124,14 +92,74 @@ async def process_telethon_update(event: NewMessage.Event) -> None:
             # telethon_msg_id = await get_telethon_msg_id(client, chat_id, 'me', message.text, message_date)
             telethon_msg_id = message_id
 
-            add_send_msgid(wx_api_response, message_id, telethon_msg_id)
+            await add_send_msgid(wx_api_response, message_id, telethon_msg_id)
+
+# ==================== 命令处理 ====================
+# 命令处理函数返回True表示已处理，返回False则继续按微信emoji发送
+async def _command_update(chat_id, message, client) -> bool:
+    """更新联系人信息"""
+    to_wxid = await contact_manager.get_wxid_by_chatid(chat_id)
+    if not to_wxid:
+        return True
+    user_info = await wechat_contacts.get_user_info(to_wxid)
+    # 更新TG群组
+    await wechat_contacts.update_info(chat_id, user_info.name, user_info.avatar_url)
+    # 更新映射文件
+    await contact_manager.update_contact_by_chatid(chat_id, {
+        "name": user_info.name,
+        "avatar_url": user_info.avatar_url
+    })
+    return True
+
+async def _command_unbind(chat_id, message, client) -> bool:
+    """删除联系人数据"""
+    to_wxid = await contact_manager.get_wxid_by_chatid(chat_id)
+    unbind_result = await contact_manager.delete_contact(to_wxid)
+    if unbind_result:
+        await telegram_sender.send_text(chat_id, locale.command("unbind_successed"))
+    return True
+
+async def _command_revoke(chat_id, message, client) -> bool:
+    """撤回，仅在回复消息时生效"""
+    if not message.reply_to_msg_id:
+        return False
+    await revoke_telethon(chat_id, message, client)
+    return True
+
+async def _command_message(chat_id, message, client) -> bool:
+    """切换是否接收信息"""
+    await contact_manager.update_contact_by_chatid(chat_id, {"is_receive": "toggle"})
+    contact_now = await contact_manager.get_contact_by_chatid(chat_id)
+    if contact_now and contact_now.is_receive:
+        await telegram_sender.send_text(chat_id, locale.command("receive_on"))
+    else:
+        await telegram_sender.send_text(chat_id, locale.command("receive_off"))
+    return True
+
+async def _command_login(chat_id, message, client) -> bool:
+    """执行二次登录"""
+    relogin = await wechat_login.twice_login(config.MY_WXID)
+    if relogin and relogin.get('Message') == "登录成功":
+        await telegram_sender.send_text(chat_id, locale.common("twice_login_success"))
+    else:
+        await telegram_sender.send_text(chat_id, locale.common("twice_login_fail"))
+    return True
+
+TELETHON_COMMAND_HANDLERS = {
+    "/update": _command_update,
+    "/unbind": _command_unbind,
+    "/rm": _command_revoke,
+    "/revoke": _command_revoke,
+    "/message": _command_message,
+    "/login": _command_login,
+}
 
 # 转发函数
 async def forward_telethon_to_wx(chat_id: str, message, client) -> bool:
     to_wxid = await contact_manager.get_wxid_by_chatid(chat_id)
     
     if not to_wxid:
-        logger.error(f"未找到chat_id {chat_id} 对应的微信ID")
+        logger.error("未找到chat_id %s 对应的微信ID", chat_id)
         return False
     
     try:
@@ -167,24 +195,15 @@ async def forward_telethon_to_wx(chat_id: str, message, client) -> bool:
 
             # 判断是否为单纯文本信息
             msg_entities = message.entities or []
-            is_url = False
-            entity = None
-            if msg_entities and len(msg_entities) > 0:
-                entity = msg_entities[0]
-                # 查找第一个链接实体
-                for item in msg_entities:
-                    if isinstance(item, (MessageEntityTextUrl, MessageEntityUrl)):
-                        entity = item
-                        is_url = True
-                        break
+            link_entity = _find_link_entity(msg_entities)
     
             if message.reply_to_msg_id:
                 # 回复消息
                 return await _send_telethon_reply(to_wxid, message, client)
-            elif msg_entities and is_url:
+            elif link_entity:
                 # 链接消息
-                return await _send_telethon_link(to_wxid, message)
-            elif msg_entities and entity and isinstance(entity, MessageEntityBlockquote):
+                return await _send_telethon_link(to_wxid, message, link_entity)
+            elif msg_entities and isinstance(msg_entities[0], MessageEntityBlockquote):
                 # 转发群聊消息时去除联系人
                 text = text.split('\n', 1)[1]
                 return await _send_telethon_text(to_wxid, text)
@@ -196,7 +215,7 @@ async def forward_telethon_to_wx(chat_id: str, message, client) -> bool:
             return False
             
     except Exception as e:
-        logger.error(f"转发消息时出错: {e}")
+        logger.error("转发消息时出错: %s", e)
         return False
 
 
@@ -230,7 +249,7 @@ async def _send_telethon_photo(to_wxid: str, message, client) -> bool:
         
         return await wechat_api("/Msg/UploadImg", payload)
     except Exception as e:
-        logger.error(f"处理图片时出错: {e}")
+        logger.error("处理图片时出错: %s", e)
         return False
 
 
@@ -241,8 +260,8 @@ async def _send_telethon_video(to_wxid: str, message, client) -> bool:
         return False
     
     try:
-        video_bytes = await client.download_media(message, file=bytes)
-        video_base64 = base64.b64encode(video_bytes).decode('utf-8')
+        # 边下载边编码，不保留完整的原始视频字节
+        video_base64, _ = await tools.telethon_media_to_base64(client, message)
         duration = getattr(message.video, 'duration', 0)
 
         # 获取视频缩略图
@@ -252,7 +271,7 @@ async def _send_telethon_video(to_wxid: str, message, client) -> bool:
         #     thumb_base64 = base64.b64encode(thumb_bytes).decode('utf-8')
         
         # 黑色缩略图
-        thumb_base64 = "/9j/4AAQSkZJRgABAQEASABIAAD/2wBDAAUDBAQEAwUEBAQFBQUGBwwIBwcHBw8LCwkMEQ8SEhEPERETFhwXExQaFRERGCEYGh0dHx8fExciJCIeJBweHx7/2wBDAQUFBQcGBw4ICA4eFBEUHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh7/wAARCAFAALQDASIAAhEBAxEB/8QAGAABAQEBAQAAAAAAAAAAAAAAAAECAwj/xAAgEAEBAQADAAICAwAAAAAAAAAAAREhMUECUSJhcYGR/8QAFgEBAQEAAAAAAAAAAAAAAAAAAAEC/8QAGBEBAQEBAQAAAAAAAAAAAAAAABEBMSH/2gAMAwEAAhEDEQA/APG9E1RrcAAqXmqkqiQAEgEAhSAESrAoCVUwazSFWJQ31AaEjItQMBoGqAtGcQCikAgFFqAAXoAAAATQE0MUJcPlZQpQBWVhQFEAUFzjRMQFgqBSAAAFnAAFCgbxhRL2C1MJeVEiZypKBACgmlKUKS4GgVQAwJD4rgqKiwEvYvqYBYQvKzoEFqQAvJQAKABSCaQEoiA0CaIA0LMxKAT+AotGmavgqXsL2AAQAvZYACxAA8KCWmkUTRloEToq1KCAA2UhQQoAAvxSiUXSq0hIAFoHXAJVX/UvIytRdQDABSpCoItRpKCAA3O0rXH2zQAAGpfWRnQ+V5KUpQBc40q1PQClJQFpSgKgBaCVGigRMWpoILoDVKGgheydroJFqeWjOh6XfoWVBDzCNAyAALc8QAPDzVoFIXtrBDtcwBk5+mqlBRkBqi+IAAABE3gBBkIuliUACAAQguftCgAUMC9JixK2GFVKCAA6eJU+gA9IAAsTeCL2gyLv5U1AACgALQBIbtFDZ9CAlUbEqNVkF0QBrwOyABD0CTKUATDFE0DQrMD0vB6AJVKAVPNWgkMUBLMVKijVSlRoAAaKGaAHoAAALn0nVA/sACgJuALUvCQLpC3E7qCzASgVaAJhSo2AAN1FjMGtISEWjIAAUhAABYFv6SkEW9ltrLUTRKi0qCeCxQTxFhKCxlq3GWgvNABqXAzkFoCUFGWgSKFCAkWAl7IvoAQAgSFTP2EUqQxIhTFgsGTwPAAAa0tCgkWJFFTpfEqilSF5qgkX0ATVElwFTtUwDTVjIALREWHaAB4CAANJVqUXCFWFBIasBU1Uw6BWV0gKy1GQWKmFAixkAaSFAqCzsEFqCAARe1vRChjLVSnYqpEWAoVNBUqALUFssAwpDQRYICxFhQQACgAAA0y1UomI0mKKkMWsgAsBFhFgMi+lBFpQC1ABYUiAAAFEAFwBYqYUZWJSoKAsFQWoA0yugXEXEAAAAAAAAADAAAGqlJcWiZjIAosSL0CAsBBe1wEMqLQQKmLooCAACxAASqEAAH//2Q=="
+        thumb_base64 = BLACK_THUMB_BASE64
         
         payload = {
             "Base64": video_base64,
@@ -264,7 +283,7 @@ async def _send_telethon_video(to_wxid: str, message, client) -> bool:
         
         return await wechat_api("/Msg/SendVideo", payload)
     except Exception as e:
-        logger.error(f"处理视频时出错: {e}")
+        logger.error("处理视频时出错: %s", e)
         return False
 
 async def _send_telethon_sticker(to_wxid: str, message, client) -> bool:
@@ -303,7 +322,7 @@ async def _send_telethon_sticker(to_wxid: str, message, client) -> bool:
         }
         return await wechat_api("/Msg/SendEmoji", payload)
     except Exception as e:
-        logger.error(f"处理贴纸时出错: {e}")
+        logger.error("处理贴纸时出错: %s", e)
         return False
 
 async def _send_telethon_voice(to_wxid: str, message, client):
@@ -355,7 +374,7 @@ async def _send_telethon_voice(to_wxid: str, message, client):
         return await wechat_api("/Msg/SendVoice", payload)
     
     except Exception as e:
-        logger.error(f"处理Telethon语音消息失败: {e}")
+        logger.error("处理Telethon语音消息失败: %s", e)
         logger.error(traceback.format_exc())
         return False
     finally:
@@ -369,9 +388,9 @@ async def _send_telethon_voice(to_wxid: str, message, client):
             if file_path and os.path.exists(file_path):
                 try:
                     os.remove(file_path)
-                    logger.debug(f"清理{file_type}: {file_path}")
+                    logger.debug("清理%s: %s", file_type, file_path)
                 except Exception as e:
-                    logger.warning(f"清理{file_type}失败 {file_path}: {e}")
+                    logger.warning("清理%s失败 %s: %s", file_type, file_path, e)
 
 async def _send_telethon_location(to_wxid: str, message) -> bool:
     """发送定位消息到微信"""
@@ -412,9 +431,9 @@ async def _send_telethon_reply(to_wxid: str, message, client):
     try:
         send_text = message.text
         reply_to_message_id = message.reply_to_msg_id
-        reply_to_wx_msgid = msgid_mapping.tg_to_wx(reply_to_message_id)
+        reply_to_wx_msgid = await msgid_mapping.tg_to_wx(reply_to_message_id)
         if reply_to_wx_msgid is None:
-            logger.warning(f"找不到TG消息ID {reply_to_message_id} 对应的微信消息映射")
+            logger.warning("找不到TG消息ID %s 对应的微信消息映射", reply_to_message_id)
             # 处理找不到映射的情况，可能需要跳过或使用默认值
             await _send_telethon_text(to_wxid, send_text)
             return True
@@ -423,7 +442,13 @@ async def _send_telethon_reply(to_wxid: str, message, client):
         reply_message = await client.get_messages(message.peer_id, ids=reply_to_message_id)
         reply_to_text = reply_message.text if reply_message and reply_message.text else ""
         
-        reply_xml = f"""<appmsg appid="" sdkver="0"><title>{send_text}</title><des /><action /><type>57</type><showtype>0</showtype><soundtype>0</soundtype><mediatagname /><messageext /><messageaction /><content /><contentattr>0</contentattr><url /><lowurl /><dataurl /><lowdataurl /><songalbumurl /><songlyric /><appattach><totallen>0</totallen><attachid /><emoticonmd5 /><fileext /><aeskey /></appattach><extinfo /><sourceusername /><sourcedisplayname /><thumburl /><md5 /><statextstr /><refermsg><content>{reply_to_text}</content><type>1</type><svrid>{int(reply_to_wx_msgid["msgid"])}</svrid><chatusr>{reply_to_wx_msgid["fromwxid"]}</chatusr><fromusr>${to_wxid}</fromusr></refermsg></appmsg>"""
+        reply_xml = message_formatter.REPLY_APPMSG_XML.format(
+            title=message_formatter.xml_escape(send_text),
+            content=message_formatter.xml_escape(reply_to_text),
+            svrid=int(reply_to_wx_msgid.msgid),
+            chatusr=message_formatter.xml_escape(reply_to_wx_msgid.fromwxid),
+            fromusr=message_formatter.xml_escape(to_wxid)
+        )
         payload = {
             "ToWxid": to_wxid,
             "Type": 49,
@@ -432,60 +457,56 @@ async def _send_telethon_reply(to_wxid: str, message, client):
         }
         return await wechat_api("/Msg/SendApp", payload)
     except Exception as e:
-        logger.error(f"处理回复消息时出错: {e}")
+        logger.error("处理回复消息时出错: %s", e)
         return False
 
-async def _send_telethon_link(to_wxid: str, message):
-    """处理链接信息"""
+def _find_link_entity(msg_entities):
+    """返回第一个链接实体（文字链接或URL），没有则返回None"""
+    for item in msg_entities:
+        if isinstance(item, LINK_ENTITY_TYPES):
+            return item
+    return None
+
+async def _send_telethon_link(to_wxid: str, message, entity):
+    """处理链接信息，entity为_find_link_entity找到的链接实体"""
     text = message.text
 
-    msg_entities = message.entities or []
-    if msg_entities and len(msg_entities) > 0:
-        entity = msg_entities[0]
-        # 查找第一个链接实体
-        for item in msg_entities:
-            if isinstance(item, (MessageEntityTextUrl, MessageEntityUrl)):
-                entity = item
-                break
-
-        if isinstance(entity, MessageEntityTextUrl) and hasattr(entity, 'url'):
-            link_title = message.text[entity.offset:entity.offset + entity.length]
-            link_url = entity.url
-            link_desc = ''
-        elif isinstance(entity, MessageEntityUrl):
-            link_title = '非公众号链接'
-            offset = entity.offset
-            length = entity.length
-            link_url = message.text[offset:offset + length]
-            link_desc = link_url
-        else:
-            return False
-        
-        if link_title and link_url:
-            xml_text = f"<appmsg><title>{link_title}</title><des>{link_desc}</des><type>5</type><url>{link_url}</url><thumburl></thumburl></appmsg>"
+    if isinstance(entity, MessageEntityTextUrl):
+        link_title = text[entity.offset:entity.offset + entity.length]
+        link_url = entity.url
+        link_desc = ''
+    else:
+        link_title = '非公众号链接'
+        link_url = message_formatter.normalize_link_url(text[entity.offset:entity.offset + entity.length])
+        link_desc = link_url
+    
+    if not (link_title and link_url):
+        return False
 
-        payload = {
-            "ToWxid": to_wxid,
-            "Type": 49,
-            "Wxid": config.MY_WXID,
-            "Xml": xml_text
-        }
-        return await wechat_api('/Msg/SendApp', payload)
+    payload = {
+        "ToWxid": to_wxid,
+        "Type": 49,
+        "Wxid": config.MY_WXID,
+        "Xml": message_formatter.LINK_APPMSG_XML.format(
+            title=message_formatter.xml_escape(link_title), des=message_formatter.xml_escape(link_desc), url=message_formatter.xml_escape(link_url)
+        )
+    }
+    return await wechat_api('/Msg/SendApp', payload)
 
 async def revoke_telethon(chat_id, message, client):
     try:
         delete_message_id = message.reply_to_msg_id
-        delete_wx_msgid = msgid_mapping.tg_to_wx(delete_message_id)
+        delete_wx_msgid = await msgid_mapping.tg_to_wx(delete_message_id)
 
         # 撤回失败时发送提示
         if not delete_wx_msgid:
             return await telegram_sender.send_text(chat_id, locale.command("revoke_failed"), reply_to_message_id=delete_message_id)
         
         # 撤回
-        to_wxid = delete_wx_msgid["towxid"]
-        new_msg_id = delete_wx_msgid["msgid"]
-        client_msg_id = delete_wx_msgid["clientmsgid"]
-        create_time = delete_wx_msgid["createtime"]
+        to_wxid = delete_wx_msgid.towxid
+        new_msg_id = delete_wx_msgid.msgid
+        client_msg_id = delete_wx_msgid.clientmsgid
+        create_time = delete_wx_msgid.createtime
         
         payload = {
             "ClientMsgId": client_msg_id,
@@ -500,7 +521,7 @@ async def revoke_telethon(chat_id, message, client):
         await client.delete_messages(message.peer_id, [message.id])
         
     except Exception as e:
-        logger.error(f"处理消息删除逻辑时出错: {e}")
+        logger.error("处理消息删除逻辑时出错: %s", e)
 
 # 获取文件的 Base64 编码
 async def get_file_base64(message, client):
@@ -515,14 +536,14 @@ async def get_file_base64(message, client):
         return file_base64
         
     except Exception as e:
-        logger.error(f"获取文件并转换为Base64失败: {e}")
+        logger.error("获取文件并转换为Base64失败: %s", e)
         return False
 
 def local_file_to_base64(file_path: str) -> str:
     """将本地文件转换为base64编码"""
     try:
         if not os.path.exists(file_path):
-            logger.error(f"文件不存在: {file_path}")
+            logger.error("文件不存在: %s", file_path)
             return None
             
         with open(file_path, 'rb') as f:
@@ -532,7 +553,7 @@ def local_file_to_base64(file_path: str) -> str:
         return file_base64
         
     except Exception as e:
-        logger.error(f"转换文件为base64失败 {file_path}: {e}")
+        logger.error("转换文件为base64失败 %s: %s", file_path, e)
         return None
 
 async def _download_telethon_voice(message, client, voice_dir: str) -> str:
@@ -574,7 +595,7 @@ async def _download_telethon_voice(message, client, voice_dir: str) -> str:
         return local_voice_path
         
     except Exception as e:
-        logger.error(f"下载语音文件失败 (message_id: {message.id}): {e}")
+        logger.error("下载语音文件失败 (message_id: %s): %s", message.id, e)
         logger.error(traceback.format_exc())
         return None
 
@@ -610,16 +631,16 @@ async def _convert_voice_to_silk(input_path: str, file_id: str, voice_dir: str)
             )
             return True
         except ffmpeg.Error as e:
-            logger.error(f"FFmpeg转换失败: {e}")
+            logger.error("FFmpeg转换失败: %s", e)
             return False
         except Exception as e:
-            logger.error(f"FFmpeg转换异常: {e}")
+            logger.error("FFmpeg转换异常: %s", e)
             return False
     
     try:
         # 检查输入文件
         if not os.path.exists(input_path):
-            logger.error(f"输入文件不存在: {input_path}")
+            logger.error("输入文件不存在: %s", input_path)
             return None
             
         # 生成PCM文件路径
@@ -654,7 +675,7 @@ async def _convert_voice_to_silk(input_path: str, file_id: str, voice_dir: str)
                 pilk.encode(pcm_path, silk_path, pcm_rate=44100, tencent=True)
                 return True
             except Exception as e:
-                logger.error(f"Pilk转换SILK失败: {e}")
+                logger.error("Pilk转换SILK失败: %s", e)
                 return False
         
         pilk_success = await loop.run_in_executor(None, _pilk_convert)
@@ -673,11 +694,11 @@ async def _convert_voice_to_silk(input_path: str, file_id: str, voice_dir: str)
             logger.error("SILK文件为空")
             return None
             
-        logger.debug(f"语音转换成功: {input_path} -> {silk_path} (PCM: {pcm_size}B, SILK: {silk_size}B)")
+        logger.debug("语音转换成功: %s -> %s (PCM: %sB, SILK: %sB)", input_path, silk_path, pcm_size, silk_size)
         return silk_path
         
     except Exception as e:
-        logger.error(f"语音转换异常: {e}")
+        logger.error("语音转换异常: %s", e)
         logger.error(traceback.format_exc())
         return None
     finally:
@@ -685,9 +706,9 @@ async def _convert_voice_to_silk(input_path: str, file_id: str, voice_dir: str)
         if pcm_path and os.path.exists(pcm_path):
             try:
                 os.remove(pcm_path)
-                logger.debug(f"清理PCM临时文件: {pcm_path}")
+                logger.debug("清理PCM临时文件: %s", pcm_path)
             except Exception as e:
-                logger.warning(f"清理PCM文件失败 {pcm_path}: {e}")
+                logger.warning("清理PCM文件失败 %s: %s", pcm_path, e)
 
 # 获取Telethon消息ID
 async def get_telethon_msg_id(client, chat_id: str, sender: str, message_text: str, message_date: datetime) -> Optional[int]:
@@ -733,9 +754,9 @@ async def get_telethon_msg_id(client, chat_id: str, sender: str, message_text: s
                 if time_diff <= 5:
                     return msg.id
         
-        logger.warning(f"未找到匹配的Telethon消息 (chat_id: {chat_id}, sender: {sender})")
+        logger.warning("未找到匹配的Telethon消息 (chat_id: %s, sender: %s)", chat_id, sender)
         return None
         
     except Exception as e:
-        logger.error(f"获取Telethon消息ID失败: {e}")
+        logger.error("获取Telethon消息ID失败: %s", e)
         return None
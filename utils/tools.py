@@ -1,10 +1,11 @@
 import asyncio
 import base64
+import functools
+import html
 import logging
 import json
 import os
 import re
-import requests
 import socket
 import tempfile
 import time
@@ -23,7 +24,6 @@ from PIL import Image
 import config
 from config import locale
 from service.telethon_client import get_client
-from utils.message_formatter import escape_html_chars
 
 logger = logging.getLogger(__name__)
 
@@ -80,7 +80,7 @@ async def get_file_from_url(
             max_retries = 3
             for attempt in range(max_retries):
                 try:
-                    logger.debug(f"尝试下载文件 (第{attempt+1}/{max_retries}次): {url}")
+                    logger.debug("尝试下载文件 (第%s/%s次): %s", attempt+1, max_retries, url)
                     
                     async with session.get(
                         url, 
@@ -89,8 +89,9 @@ async def get_file_from_url(
                     ) as response:
                         
                         # ✅ 详细的状态码检查
-                        logger.debug(f"响应状态码: {response.status}")
-                        logger.debug(f"响应头: {dict(response.headers)}")
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("响应状态码: %s", response.status)
+                            logger.debug("响应头: %s", dict(response.headers))
                         
                         if response.status == 403:
                             logger.error("403 Forbidden - 可能需要登录或权限")
@@ -109,19 +110,19 @@ async def get_file_from_url(
                         # ✅ 检查Content-Type
                         content_type = response.headers.get('Content-Type', '')
                         content_length = response.headers.get('Content-Length', '0')
-                        logger.debug(f"Content-Type: {content_type}")
-                        logger.debug(f"Content-Length: {content_length}")
+                        logger.debug("Content-Type: %s", content_type)
+                        logger.debug("Content-Length: %s", content_length)
                         
                         # ✅ 获取文件名
                         filename = get_filename_from_response(response, url, default_filename)
-                        logger.debug(f"解析到的文件名: {filename}")
+                        logger.debug("解析到的文件名: %s", filename)
                         
                         # ✅ 如果需要保存文件，创建完整路径
                         file_path = None
                         if save_file:
                             os.makedirs(save_dir, exist_ok=True)  # 确保目录存在
                             file_path = os.path.join(save_dir, filename)
-                            logger.debug(f"文件将保存到: {file_path}")
+                            logger.debug("文件将保存到: %s", file_path)
                         
                         # ✅ 分块下载大文件
                         file_data = BytesIO() if not save_file else None
@@ -142,7 +143,7 @@ async def get_file_from_url(
                                     file_data.write(chunk)
                                     downloaded_size += len(chunk)
                         
-                        logger.debug(f"下载完成，文件大小: {downloaded_size} bytes")
+                        logger.debug("下载完成，文件大小: %s bytes", downloaded_size)
                         
                         if downloaded_size == 0:
                             logger.warning("下载的文件数据为空")
@@ -425,6 +426,28 @@ async def _download_via_api(file_id):
     
     return file_base64
 
+async def telethon_media_to_base64(client, message) -> Tuple[str, int]:
+    """
+    分块下载Telethon消息中的媒体并增量编码为Base64
+    
+    Returns:
+        tuple: (Base64字符串, 原始文件字节数)
+    """
+    parts = []
+    remainder = b""
+    file_size = 0
+    
+    async for chunk in client.iter_download(message.media):
+        file_size += len(chunk)
+        data = remainder + chunk
+        # 按3字节对齐编码，分段结果拼接后与整体编码一致
+        cut = len(data) - len(data) % 3
+        parts.append(base64.b64encode(data[:cut]).decode('ascii'))
+        remainder = data[cut:]
+    
+    parts.append(base64.b64encode(remainder).decode('ascii'))
+    return "".join(parts), file_size
+
 async def _download_via_telethon(chat_id, message_id):
     """通过Telethon下载文件"""   
     start_time = time.time()
@@ -436,17 +459,14 @@ async def _download_via_telethon(chat_id, message_id):
     if not message or not message.media:
         raise ValueError(f"消息 {message_id} 不存在或不包含媒体文件")
     
-    # 下载文件到内存
-    file_content = await client.download_media(message, file=bytes)
+    # 边下载边转换为Base64，不在内存中保留完整的原始文件
+    file_base64, file_size = await telethon_media_to_base64(client, message)
     
-    if not file_content:
+    if not file_size:
         raise RuntimeError("Telethon下载失败，文件内容为空")
     
-    # 转换为Base64
-    file_base64 = base64.b64encode(file_content).decode('utf-8')
-    
     download_time = time.time() - start_time
-    file_size_mb = len(file_content) / (1024 * 1024)
+    file_size_mb = file_size / (1024 * 1024)
     logger.info(f"✅ Telethon下载完成，大小: {file_size_mb:.2f}MB，耗时: {download_time:.2f}s")
     
     return file_base64
@@ -724,25 +744,31 @@ def process_avatar_image(image_data: bytes, min_size: int = 512) -> BytesIO:
         except Exception:
             return BytesIO(image_data)
 
+@functools.lru_cache(maxsize=64)
+def _split_key_path(key: str) -> Tuple[str, ...]:
+    """将 'ToUserName.string' 形式的嵌套键拆分为路径元组"""
+    return tuple(key.split('.'))
+
 def multi_get(data, *keys, default=''):
-    """从多个键中获取第一个有效值"""
+    """从多个键中获取第一个有效值
+
+    键可以是 'ToUserName.string' 形式的字符串，也可以是预先拆分好的路径元组
+    """
     for key in keys:
-        if '.' in key:
-            # 处理嵌套键如 'ToUserName.string'
-            parts = key.split('.')
-            value = data
-            for part in parts:
-                if isinstance(value, dict):
-                    value = value.get(part, {})
-                else:
-                    value = {}
-                    break
-            if value != {} and value is not None:
-                return value
-        else:
-            value = data.get(key)
-            if value is not None:
-                return value
+        if isinstance(key, str):
+            if '.' not in key:
+                value = data.get(key)
+                if value is not None:
+                    return value
+                continue
+            key = _split_key_path(key)
+        value = data
+        for part in key:
+            value = value.get(part) if isinstance(value, dict) else None
+            if value is None:
+                break
+        if value is not None:
+            return value
     return default
 
 def parse_chunked_response(body):
@@ -926,7 +952,35 @@ async def restart_container(container_name):
         logger.info(f"🔍 错误详情: {traceback.format_exc()}")
         return False
 
-def get_60s(format_type="text"):
+# 60s新闻编号用的圈数字符号
+CIRCLE_NUMBERS = ('①', '②', '③', '④', '⑤', '⑥', '⑦', '⑧', '⑨', '⑩',
+                  '⑪', '⑫', '⑬', '⑭', '⑮', '⑯', '⑰', '⑱', '⑲', '⑳')
+
+@functools.lru_cache(maxsize=8)
+def _format_60s(date: str, news_list: tuple) -> Tuple[str, str]:
+    """将60s新闻格式化为普通文本和HTML两种格式，同一天的内容只格式化一次"""
+    # 标题行
+    text_lines = ["📰 每天60秒读懂世界", f"日期：{date}"]
+    html_lines = ["<blockquote>📰 每天60秒读懂世界</blockquote>", f"<blockquote>日期：{date}</blockquote>"]
+    
+    # 添加编号的新闻条目
+    for i, news in enumerate(news_list):
+        # 超出20条时使用普通数字
+        number = CIRCLE_NUMBERS[i] if i < len(CIRCLE_NUMBERS) else f"{i+1}. "
+        text_lines.append(f"{number}{news}")
+        html_lines.append(f"<blockquote>{number}{html.escape(news, quote=False)}</blockquote>")
+    
+    return "\n".join(text_lines).strip(), "\n".join(html_lines).strip()
+
+# 60s新闻API的条件请求缓存，内容未更新时服务器返回304，直接复用上次的数据
+_60s_cache = {"etag": None, "last_modified": None, "data": None}
+
+# 60s新闻接口的重试策略：网关错误或连接失败时退避重试
+_60S_RETRY_STATUSES = (502, 503, 504)
+_60S_MAX_RETRIES = 2
+_60S_BACKOFF = 0.3  # 秒
+
+async def get_60s(format_type="text"):
     """获取API内容并格式化为指定格式
     
     Args:
@@ -942,70 +996,75 @@ def get_60s(format_type="text"):
     url="https://60s-api.viki.moe/v2/60s"
 
     try:       
-        # 发送GET请求
-        response = requests.get(url, timeout=10)
+        # 带上缓存的校验信息发送GET请求
+        headers = {}
+        if _60s_cache["data"] is not None:
+            if _60s_cache["etag"]:
+                headers["If-None-Match"] = _60s_cache["etag"]
+            if _60s_cache["last_modified"]:
+                headers["If-Modified-Since"] = _60s_cache["last_modified"]
+        
+        timeout = aiohttp.ClientTimeout(sock_connect=3, total=10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            # 重试复用同一个会话的连接池
+            for attempt in range(_60S_MAX_RETRIES + 1):
+                last_attempt = attempt == _60S_MAX_RETRIES
+                try:
+                    async with session.get(url, headers=headers) as response:
+                        status = response.status
+                        if status == 200:
+                            # 获取JSON数据并更新缓存
+                            data = await response.json(content_type=None)
+                            _60s_cache["etag"] = response.headers.get("ETag")
+                            _60s_cache["last_modified"] = response.headers.get("Last-Modified")
+                            _60s_cache["data"] = data
+                        elif status == 304:
+                            # 内容未变化，使用缓存
+                            status = 200
+                            data = _60s_cache["data"]
+                    if status not in _60S_RETRY_STATUSES or last_attempt:
+                        break
+                    logger.warning(f"⚠️ 60s接口返回 {status}，准备重试 ({attempt + 1}/{_60S_MAX_RETRIES})")
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if last_attempt:
+                        raise
+                    logger.warning(f"⚠️ 60s接口连接失败，准备重试 ({attempt + 1}/{_60S_MAX_RETRIES}): {e}")
+                await asyncio.sleep(_60S_BACKOFF * (2 ** attempt))
         
         # 检查响应状态码
-        if response.status_code == 200:
-            # 获取JSON数据
-            data = response.json()
-            
+        if status == 200:
             if 'data' in data:
                 news_data = data['data']
                 date = news_data.get('date', 'N/A')
-                news_list = news_data.get('news', [])
-                
-                # 构建普通文本格式
-                text_format = "📰 每天60秒读懂世界\n"
-                text_format += f"日期：{date}\n"
-                
-                # 构建HTML格式
-                html_format = "<blockquote>📰 每天60秒读懂世界</blockquote>\n"
-                html_format += f"<blockquote>日期：{date}</blockquote>\n"
-                
-                # 圈数字符号列表
-                circle_numbers = ['①', '②', '③', '④', '⑤', '⑥', '⑦', '⑧', '⑨', '⑩', 
-                                '⑪', '⑫', '⑬', '⑭', '⑮', '⑯', '⑰', '⑱', '⑲', '⑳']
-                
-                # 添加编号的新闻条目
-                for i, news in enumerate(news_list):
-                    if i < len(circle_numbers):  # 确保不超出圈数字符号范围
-                        # 普通文本格式
-                        text_format += f"{circle_numbers[i]}{news}\n"
-                        # HTML格式
-                        html_format += f"<blockquote>{circle_numbers[i]}{escape_html_chars(news)}</blockquote>\n"
-                    else:
-                        # 如果超出20条，使用普通数字
-                        text_format += f"{i+1}. {news}\n"
-                        html_format += f"<blockquote>{i+1}. {escape_html_chars(news)}</blockquote>\n"
+                text_format, html_format = _format_60s(date, tuple(news_data.get('news', [])))
                 
                 # 根据format_type返回相应格式
                 if format_type == "text":
                     return {
                         "date": date,
-                        "text": text_format.strip()  # 去掉最后的换行符
+                        "text": text_format
                     }
                 elif format_type == "html":
                     return {
                         "date": date,
-                        "html": html_format.strip()  # 去掉最后的换行符
+                        "html": html_format
                     }
                 elif format_type == "both":
                     return {
                         "date": date,
-                        "text": text_format.strip(),
-                        "html": html_format.strip()
+                        "text": text_format,
+                        "html": html_format
                     }
                 else:
                     logger.warning(f"未知的格式类型: {format_type}，使用默认文本格式")
-                    return text_format.strip()
+                    return text_format
                     
             else:
                 logger.error("❌ API响应中没有找到data字段")
                 return None
                 
         else:
-            logger.error(f"❌ 请求失败，状态码: {response.status_code}")
+            logger.error(f"❌ 请求失败，状态码: {status}")
             return None
             
     except Exception as e: